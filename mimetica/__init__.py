@@ -1,11 +1,31 @@
-from .utils.config import conf
-from .utils.logger import logger
-from .gui.dock import Dock
-from .gui.plot import Plot
-from .scan.layer import Layer
-from .gui.thumbnail import Thumbnail
-from .scan.stack import Stack
-from .gui.image import ImageView
-from .gui.canvas import Canvas
-from .gui.splitview import SplitView
-from .gui.tab import Tab
+import importlib
+
+# Public names are imported on first access, so that
+# the analysis can be used without importing Qt.
+_exports = {
+    "conf": ".utils.config",
+    "logger": ".utils.logger",
+    "Dock": ".gui.dock",
+    "Plot": ".gui.plot",
+    "Layer": ".scan.layer",
+    "Thumbnail": ".gui.thumbnail",
+    "Stack": ".scan.stack",
+    "Scheduler": ".gui.scheduler",
+    "ImageView": ".gui.image",
+    "Canvas": ".gui.canvas",
+    "SplitView": ".gui.splitview",
+    "Tab": ".gui.tab",
+}
+
+
+def __getattr__(name: str):
+    if name not in _exports:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+    value = getattr(importlib.import_module(_exports[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(list(globals()) + list(_exports))
@@ -0,0 +1,414 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from importlib import metadata
+from pathlib import Path
+
+import json
+import os
+import platform
+import tempfile
+import time
+
+import numpy as np
+import skimage as ski
+
+from mimetica import logger
+from mimetica import utils
+from mimetica.bench import synthetic
+from mimetica.scan import pipeline
+from mimetica.scan import sampling
+from mimetica.scan.layer import Layer
+from mimetica.scan.mask import Mask
+
+
+# Bump this whenever the benchmarks change in a way that
+# makes their results incomparable with earlier ones.
+BENCH_VERSION = 2
+
+
+def measure(
+    function,
+    repeat: int,
+    warmup: int = 1,
+) -> list[float]:
+    """
+    Time a function.
+
+    Warm-up calls are not timed, so one-off costs
+    (e.g., building the sampling templates) are excluded.
+
+    Args:
+        function: The function, called without arguments.
+        repeat: Number of timed calls.
+        warmup: Number of calls before timing.
+
+    Returns:
+        The wall time of each timed call in seconds.
+    """
+    for _ in range(warmup):
+        function()
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _result(
+    benchmark: str,
+    params: dict,
+    times: list[float],
+    **extra,
+) -> dict:
+    result = {
+        "benchmark": benchmark,
+        "params": params,
+        "times": times,
+        "median": float(np.median(times)),
+        "min": min(times),
+    }
+    result.update(extra)
+    logger.info(f"{benchmark} {params}: {1000 * result['median']:.2f} ms")
+    return result
+
+
+def bench_layer(
+    directory: Path,
+    size: int,
+    shape: str,
+    samples: list[tuple[int, int]],
+    repeat: int,
+    **kwargs,
+) -> list[dict]:
+    """
+    Time the stages of the analysis of a single slice.
+
+    Args:
+        directory: Directory for the synthetic image.
+        size: Size of the slice.
+        shape: "disk" or "ring".
+        samples: Pairs of radial and phase sample counts for the profiles.
+        repeat: Number of timed runs of each stage.
+        kwargs: Arguments passed on to `synthetic.porous_slice`.
+
+    Returns:
+        The results.
+    """
+    inner = kwargs.pop("inner", 0.2) if shape == "ring" else 0.0
+    path = Path(directory) / f"{shape}_{size}.png"
+    ski.io.imsave(
+        path,
+        synthetic.porous_slice(size, inner=inner, **kwargs),
+        check_contrast=False,
+    )
+
+    params = {"size": size, "shape": shape}
+    image = np.fliplr(ski.io.imread(str(path), as_gray=True).T)
+    (centre, mbr) = utils.compute_minimal_bounding_circle(image)
+    mask = Mask(image)
+    layer = Layer(path)
+
+    results = [
+        _result(
+            "layer/decode",
+            params,
+            measure(lambda: ski.io.imread(str(path), as_gray=True), repeat),
+        ),
+        _result(
+            "layer/mbc",
+            params,
+            measure(lambda: utils.compute_minimal_bounding_circle(image), repeat),
+        ),
+        _result(
+            "layer/mask",
+            params,
+            measure(lambda: Mask(image), repeat),
+        ),
+        _result(
+            "layer/ring_histogram",
+            params,
+            measure(lambda: sampling.ring_histogram(mask, centre, mbr), repeat),
+        ),
+        _result(
+            "layer/spoke_histogram",
+            params,
+            measure(
+                lambda: sampling.spoke_histogram(mask, centre, mbr, sampling.PHASE_RESOLUTION),
+                repeat,
+            ),
+        ),
+        _result(
+            "layer/total",
+            params,
+            measure(lambda: Layer(path), repeat),
+        ),
+    ]
+
+    for (radial_samples, phase_samples) in samples:
+        results.append(
+            _result(
+                "layer/radial_profile",
+                params | {"samples": radial_samples},
+                measure(lambda: layer.make_radial_profile(radial_samples), repeat),
+            )
+        )
+        results.append(
+            _result(
+                "layer/phase_profile",
+                params | {"samples": phase_samples},
+                measure(lambda: layer.make_phase_profile(phase_samples), repeat),
+            )
+        )
+
+    return results
+
+
+def bench_stack(
+    directory: Path,
+    size: int,
+    layers: int,
+    workers: int,
+    repeat: int,
+    **kwargs,
+) -> dict:
+    """
+    Time analysing a full stack with a pool of worker processes.
+
+    Only the analysis of the layers is timed. The pool is started once
+    beforehand and warmed up with a run that is not timed, and nothing
+    is written (no checkpoints and no exports). The result cache is
+    not used.
+
+    Args:
+        directory: Directory for the synthetic stack.
+        size: Size of the slices.
+        layers: Number of slices.
+        workers: Number of worker processes.
+        repeat: Number of timed runs.
+        kwargs: Arguments passed on to `synthetic.porous_slice`.
+
+    Returns:
+        The result.
+    """
+    directory = Path(directory)
+    stack = directory / f"stack_{size}_{layers}"
+    if not stack.exists():
+        synthetic.write_stack(stack, layers, drift=(0.02, -0.02), size=size, **kwargs)
+    sources = pipeline.find_images(stack)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+
+        def load():
+            futures = [
+                executor.submit(
+                    pipeline.analyse_layer,
+                    source,
+                    sampling.RADIAL_SAMPLES,
+                    sampling.PHASE_SAMPLES,
+                    False,
+                )
+                for source in sources
+            ]
+            for future in futures:
+                future.result()
+
+        times = measure(load, repeat, warmup=1)
+
+    return _result(
+        "stack/load",
+        {"size": size, "layers": layers, "workers": workers},
+        times,
+        throughput=layers / float(np.median(times)),
+    )
+
+
+def environment() -> dict:
+    """
+    Describe the machine and the software the benchmarks ran on.
+
+    Returns:
+        The description.
+    """
+    try:
+        version = metadata.version("mimetica")
+    except metadata.PackageNotFoundError:
+        version = None
+
+    return {
+        "mimetica": version,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run(
+    sizes: list[int],
+    samples: list[tuple[int, int]],
+    workers: list[int],
+    shapes: list[str] = ("disk", "ring"),
+    layers: int = 32,
+    repeat: int = 5,
+    porosity: float = 0.3,
+    offset: tuple[float, float] = (0.03, -0.02),
+) -> dict:
+    """
+    Run the benchmark suite on synthetic slices.
+
+    Args:
+        sizes: Sizes of the slices.
+        samples: Pairs of radial and phase sample counts.
+        workers: Numbers of worker processes for loading stacks.
+        shapes: Shapes of the material ("disk" and / or "ring").
+        layers: Number of slices in each stack.
+        repeat: Number of timed runs of each benchmark.
+        porosity: Porosity of the material.
+        offset: Offset of the centre of the material, as a fraction of the size.
+
+    Returns:
+        The report, with the results of every benchmark,
+        the configuration and the environment.
+    """
+    config = {
+        "sizes": list(sizes),
+        "samples": [list(pair) for pair in samples],
+        "workers": list(workers),
+        "shapes": list(shapes),
+        "layers": layers,
+        "repeat": repeat,
+        "porosity": porosity,
+        "offset": list(offset),
+    }
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            for shape in shapes:
+                results.extend(
+                    bench_layer(
+                        directory,
+                        size,
+                        shape,
+                        samples,
+                        repeat,
+                        porosity=porosity,
+                        offset=offset,
+                    )
+                )
+
+            for count in workers:
+                results.append(
+                    bench_stack(
+                        directory,
+                        size,
+                        layers,
+                        count,
+                        max(1, repeat // 2),
+                        porosity=porosity,
+                        offset=offset,
+                    )
+                )
+
+    return {
+        "version": BENCH_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "config": config,
+        "results": results,
+    }
+
+
+def _key(result: dict) -> tuple[str, str]:
+    return (result["benchmark"], json.dumps(result["params"], sort_keys=True))
+
+
+def compare(
+    baseline: dict,
+    current: dict,
+    threshold: float = 0.1,
+) -> list[dict]:
+    """
+    Compare the results of two runs of the benchmark suite.
+
+    Benchmarks are matched by name and parameters, and their median
+    times are compared. A benchmark is flagged as a regression if it
+    is slower than the baseline by more than the threshold.
+
+    Args:
+        baseline: The report of the baseline run.
+        current: The report of the current run.
+        threshold: Relative slowdown (e.g., 0.1 for 10%) above which
+            a benchmark is flagged.
+
+    Returns:
+        One entry per benchmark, with the median times, their ratio and
+        the status of the benchmark ("regression", "improvement", "ok",
+        "new" if it is missing from the baseline or "missing"
+        if it is missing from the current run).
+    """
+    if baseline.get("version") != current.get("version"):
+        logger.warning(
+            f"Comparing benchmarks of different versions "
+            f"({baseline.get('version')} and {current.get('version')})"
+        )
+    if baseline.get("environment") != current.get("environment"):
+        logger.warning("The benchmarks ran in different environments")
+
+    old = {_key(result): result for result in baseline["results"]}
+    new = {_key(result): result for result in current["results"]}
+
+    rows = []
+    for key in list(old) + [key for key in new if key not in old]:
+        row = {
+            "benchmark": key[0],
+            "params": json.loads(key[1]),
+            "baseline": old[key]["median"] if key in old else None,
+            "current": new[key]["median"] if key in new else None,
+            "ratio": None,
+        }
+        if key not in new:
+            row["status"] = "missing"
+        elif key not in old:
+            row["status"] = "new"
+        else:
+            row["ratio"] = row["current"] / row["baseline"]
+            if row["ratio"] > 1 + threshold:
+                row["status"] = "regression"
+            elif row["ratio"] < 1 / (1 + threshold):
+                row["status"] = "improvement"
+            else:
+                row["status"] = "ok"
+        rows.append(row)
+
+    return rows
+
+
+def load(path: Path) -> dict:
+    """
+    Load a benchmark report.
+
+    Args:
+        path: Path to the report.
+
+    Returns:
+        The report.
+    """
+    return json.loads(Path(path).read_text())
+
+
+def save(
+    report: dict,
+    path: Path,
+):
+    """
+    Save a benchmark report.
+
+    Args:
+        report: The report.
+        path: Path to the report.
+    """
+    Path(path).write_text(json.dumps(report, indent=2))
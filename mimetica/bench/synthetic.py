@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import numpy as np
+import skimage as ski
+
+
+def porous_slice(
+    size: int = 512,
+    radius: float = 0.4,
+    inner: float = 0.0,
+    porosity: float = 0.3,
+    offset: tuple[float, float] = (0.0, 0.0),
+    pore_size: int = 6,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    Create a synthetic microCT slice of a porous disk or ring.
+
+    The material is a disk (or a ring if `inner` is positive) with pores
+    made of square blocks of random noise, which is enough to give the
+    analysis realistic contours and profiles.
+
+    Args:
+        size: Width and height of the slice in pixels.
+        radius: Outer radius as a fraction of the size.
+        inner: Inner radius of a ring as a fraction of the size (0 for a disk).
+        porosity: Fraction of the disk or ring occupied by pores.
+        offset: Offset of the centre from the centre of the slice,
+            as a fraction of the size.
+        pore_size: Width of the pores in pixels.
+        seed: Seed for the random pores.
+
+    Returns:
+        An 8-bit image with the material set to 255.
+    """
+    rng = np.random.default_rng(seed)
+
+    (Y, X) = np.ogrid[:size, :size]
+    cx = size / 2 + offset[0] * size
+    cy = size / 2 + offset[1] * size
+    distance = (X - cx) ** 2 + (Y - cy) ** 2
+    material = (distance <= (radius * size) ** 2) & (distance >= (inner * size) ** 2)
+
+    blocks = -(-size // pore_size)
+    noise = rng.random((blocks, blocks))
+    noise = np.repeat(np.repeat(noise, pore_size, axis=0), pore_size, axis=1)
+    material &= noise[:size, :size] >= porosity
+
+    return material.astype(np.uint8) * 255
+
+
+def write_stack(
+    directory: Path,
+    layers: int,
+    drift: tuple[float, float] = (0.0, 0.0),
+    seed: int = 0,
+    **kwargs,
+) -> list[Path]:
+    """
+    Write a stack of synthetic slices as PNG images.
+
+    Each slice has its own pores, and the centre can drift
+    from one slice to the next like in a tilted sample.
+
+    Args:
+        directory: The output directory.
+        layers: Number of slices.
+        drift: Total drift of the centre over the stack, as a fraction of the size.
+        seed: Seed for the first slice (the following slices use the next seeds).
+        kwargs: Arguments passed on to `porous_slice`.
+
+    Returns:
+        The paths to the images.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    (ox, oy) = kwargs.pop("offset", (0.0, 0.0))
+    paths = []
+    for index in range(layers):
+        fraction = index / max(1, layers - 1)
+        image = porous_slice(
+            offset=(ox + drift[0] * fraction, oy + drift[1] * fraction),
+            seed=seed + index,
+            **kwargs,
+        )
+        path = directory / f"slice_{index:05d}.png"
+        ski.io.imsave(path, image, check_contrast=False)
+        paths.append(path)
+
+    return paths
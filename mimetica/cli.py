@@ -0,0 +1,448 @@
+from pathlib import Path
+
+import cloup
+import platform
+import multiprocessing as mp
+import sys
+import time
+
+from mimetica import logger
+from mimetica.scan import sampling
+from mimetica.scan.batch import BatchScheduler
+from mimetica.scan.cache import ResultCache
+
+
+def set_start_method():
+    """
+    Set the multiprocessing context for the worker processes.
+    """
+    plt = platform.system()
+    logger.warning(f"Running on {plt}")
+    if plt.lower() == "windows":
+        mp.set_start_method("spawn")
+    else:
+        mp.set_start_method("forkserver")
+
+
+@cloup.group(invoke_without_command=True)
+@cloup.option_group(
+    "Input",
+    "Open one or more images.",
+    cloup.option(
+        "-i",
+        "--image",
+        type=str,
+        default=None,
+        help="Open a single image.",
+    ),
+    cloup.option(
+        "-s",
+        "--stack",
+        type=str,
+        default=None,
+        help="Open a stack (directory of images or multi-page TIFF).",
+    ),
+    constraint=cloup.constraints.mutually_exclusive
+)
+@cloup.pass_context
+def run(
+    ctx: cloup.Context,
+    image: str | None,
+    stack: str | None,
+):
+
+    # Subcommands do not start the GUI
+    if ctx.invoked_subcommand is not None:
+        return
+
+    set_start_method()
+
+    # The main feature
+    from mimetica.gui.main import main
+
+    main(image, stack)
+
+
+@run.command()
+@cloup.argument(
+    "stacks",
+    nargs=-1,
+    required=True,
+    type=cloup.Path(exists=True, path_type=Path),
+)
+@cloup.option(
+    "-o",
+    "--output",
+    type=cloup.Path(file_okay=False, path_type=Path),
+    required=True,
+    help="Output directory (one subdirectory per stack).",
+)
+@cloup.option(
+    "-r",
+    "--radial-samples",
+    type=int,
+    default=sampling.RADIAL_SAMPLES,
+    show_default=True,
+    help="Number of radial samples.",
+)
+@cloup.option(
+    "-p",
+    "--phase-samples",
+    type=int,
+    default=sampling.PHASE_SAMPLES,
+    show_default=True,
+    help="Number of phase samples.",
+)
+@cloup.option(
+    "-w",
+    "--workers",
+    type=int,
+    default=None,
+    help="Number of worker processes (defaults to the number of CPUs).",
+)
+@cloup.option(
+    "-n",
+    "--max-stacks",
+    type=int,
+    default=2,
+    show_default=True,
+    help="Maximal number of stacks analysed concurrently.",
+)
+@cloup.option(
+    "-m",
+    "--memory",
+    type=int,
+    default=4096,
+    show_default=True,
+    help="Memory budget in MiB for the layers being analysed.",
+)
+@cloup.option(
+    "--no-cache",
+    is_flag=True,
+    default=False,
+    help="Do not use the cache of analysis results.",
+)
+@cloup.option(
+    "--stream",
+    type=cloup.Choice(["csv", "npz", "parquet"]),
+    default=None,
+    help=(
+        "Write the profiles of each layer in this format as soon as the layer is analysed, "
+        "instead of the profile tables (memory use does not grow with the stack)."
+    ),
+)
+@cloup.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Profile each stage of the analysis and write a trace to the output directory.",
+)
+@cloup.option(
+    "--restart",
+    is_flag=True,
+    default=False,
+    help="Discard the progress of a previous run instead of resuming it.",
+)
+def batch(
+    stacks: tuple[Path, ...],
+    output: Path,
+    radial_samples: int,
+    phase_samples: int,
+    workers: int | None,
+    max_stacks: int,
+    memory: int,
+    no_cache: bool,
+    stream: str | None,
+    profile: bool,
+    restart: bool,
+):
+    """
+    Analyse one or more stacks without the GUI.
+
+    Each stack (a directory of images or a multi-page TIFF) is written to
+    a subdirectory of the output directory, with the radial and phase profiles
+    of each layer, a summary of the layers and the profile statistics.
+
+    Progress is recorded in the output directory, and running the same
+    command again resumes an interrupted batch.
+    """
+    set_start_method()
+
+    scheduler = BatchScheduler(
+        list(stacks),
+        output,
+        radial_samples=radial_samples,
+        phase_samples=phase_samples,
+        workers=workers,
+        max_stacks=max_stacks,
+        memory_budget=memory * 2**20,
+        use_cache=not no_cache,
+        restart=restart,
+        stream=stream,
+        profile=profile,
+    )
+    start = time.perf_counter()
+    results = scheduler.run()
+    elapsed = time.perf_counter() - start
+
+    # Throughput report
+    # ==================================================
+    analysed = 0
+    failed = []
+    for stack, entry in results.items():
+        analysed += entry["analysed"]
+        logger.info(
+            f"{entry['name']}: {entry['analysed']}/{entry['slices']} slices analysed "
+            f"in {entry['elapsed']:.2f} s ({entry['throughput']:.1f} slices/s)"
+        )
+        if entry["status"] == "failed":
+            failed.append(stack)
+    logger.info(
+        f"Analysed {analysed} slices from {len(results)} stacks in {elapsed:.2f} s "
+        f"({analysed / elapsed if elapsed > 0 else 0.0:.1f} slices/s)"
+    )
+
+    if len(failed) > 0:
+        logger.error(
+            f"{len(failed)} stacks failed (see '{Path(output) / 'manifest.json'}'): "
+            + ", ".join(failed)
+        )
+        sys.exit(1)
+
+
+@run.group()
+def cache():
+    """
+    Manage the cache of analysis results.
+    """
+
+
+@cache.command()
+@cloup.option(
+    "-m",
+    "--max-size",
+    type=int,
+    default=None,
+    help="Maximal size of the cache in MiB (defaults to the configured size; 0 clears the cache).",
+)
+def prune(
+    max_size: int | None,
+):
+    """
+    Evict the least recently used entries from the cache.
+    """
+    if max_size is None:
+        # The configuration is stored in the Qt settings
+        from mimetica import conf
+
+        max_size = conf.cache_size
+
+    result_cache = ResultCache()
+    evicted, freed = result_cache.prune(max_size * 2**20)
+    logger.info(
+        f"Evicted {evicted} files ({freed / 2**20:.1f} MiB) from '{result_cache.root}', "
+        f"{result_cache.nbytes / 2**20:.1f} MiB left"
+    )
+
+
+def _parse_list(
+    ctx: cloup.Context,
+    param: cloup.Parameter,
+    value: str,
+) -> list[int]:
+    try:
+        return [int(item) for item in value.split(",")]
+    except ValueError:
+        raise cloup.BadParameter(f"Expected a comma-separated list of integers, got '{value}'")
+
+
+def _report_comparison(
+    rows: list[dict],
+) -> int:
+    """
+    Log a comparison of benchmark reports.
+
+    Args:
+        rows: The comparison created by `suite.compare`.
+
+    Returns:
+        The number of regressions.
+    """
+    for row in rows:
+        baseline = "-" if row["baseline"] is None else f"{1000 * row['baseline']:.2f} ms"
+        current = "-" if row["current"] is None else f"{1000 * row['current']:.2f} ms"
+        ratio = "" if row["ratio"] is None else f" ({row['ratio']:.2f}x)"
+        logger.info(
+            f"{row['status'].upper():<12} {row['benchmark']} {row['params']}: "
+            f"{baseline} -> {current}{ratio}"
+        )
+
+    regressions = sum(row["status"] == "regression" for row in rows)
+    logger.info(f"{regressions} regressions in {len(rows)} benchmarks")
+    return regressions
+
+
+@run.group()
+def bench():
+    """
+    Benchmark the analysis on synthetic slices.
+    """
+
+
+@bench.command(name="run")
+@cloup.option(
+    "-o",
+    "--output",
+    type=cloup.Path(dir_okay=False, path_type=Path),
+    required=True,
+    help="Output file for the results (JSON).",
+)
+@cloup.option(
+    "--sizes",
+    type=str,
+    default="256,512,1024",
+    show_default=True,
+    callback=_parse_list,
+    help="Comma-separated sizes of the slices.",
+)
+@cloup.option(
+    "--radial-samples",
+    type=str,
+    default=f"{sampling.RADIAL_SAMPLES},1000",
+    show_default=True,
+    callback=_parse_list,
+    help="Comma-separated numbers of radial samples.",
+)
+@cloup.option(
+    "--phase-samples",
+    type=str,
+    default=f"{sampling.PHASE_SAMPLES},1440",
+    show_default=True,
+    callback=_parse_list,
+    help="Comma-separated numbers of phase samples (paired with the radial samples).",
+)
+@cloup.option(
+    "--workers",
+    type=str,
+    default="1,4",
+    show_default=True,
+    callback=_parse_list,
+    help="Comma-separated numbers of worker processes for loading stacks.",
+)
+@cloup.option(
+    "--layers",
+    type=int,
+    default=32,
+    show_default=True,
+    help="Number of slices in each stack.",
+)
+@cloup.option(
+    "--repeat",
+    type=int,
+    default=5,
+    show_default=True,
+    help="Number of timed runs of each benchmark.",
+)
+@cloup.option(
+    "--porosity",
+    type=float,
+    default=0.3,
+    show_default=True,
+    help="Porosity of the synthetic material.",
+)
+@cloup.option(
+    "--offset",
+    type=(float, float),
+    default=(0.03, -0.02),
+    show_default=True,
+    help="Offset of the centre of the material, as a fraction of the size.",
+)
+@cloup.option(
+    "-b",
+    "--baseline",
+    type=cloup.Path(exists=True, dir_okay=False, path_type=Path),
+    default=None,
+    help="Compare the results with a baseline and fail if there are regressions.",
+)
+@cloup.option(
+    "-t",
+    "--threshold",
+    type=float,
+    default=0.1,
+    show_default=True,
+    help="Relative slowdown above which a benchmark is flagged as a regression.",
+)
+def bench_run(
+    output: Path,
+    sizes: list[int],
+    radial_samples: list[int],
+    phase_samples: list[int],
+    workers: list[int],
+    layers: int,
+    repeat: int,
+    porosity: float,
+    offset: tuple[float, float],
+    baseline: Path | None,
+    threshold: float,
+):
+    """
+    Time the stages of the analysis of single slices (decoding, MBC, mask,
+    histograms and profiles) and the loading of full stacks on synthetic
+    porous disks and rings.
+    """
+    from mimetica.bench import suite
+
+    if len(radial_samples) != len(phase_samples):
+        raise cloup.BadParameter("The radial and phase samples must be paired.")
+
+    set_start_method()
+
+    report = suite.run(
+        sizes,
+        list(zip(radial_samples, phase_samples)),
+        workers,
+        layers=layers,
+        repeat=repeat,
+        porosity=porosity,
+        offset=offset,
+    )
+    suite.save(report, output)
+    logger.info(f"Results written to '{output}'")
+
+    if baseline is not None:
+        rows = suite.compare(suite.load(baseline), report, threshold)
+        if _report_comparison(rows) > 0:
+            sys.exit(1)
+
+
+@bench.command(name="compare")
+@cloup.argument(
+    "baseline",
+    type=cloup.Path(exists=True, dir_okay=False, path_type=Path),
+)
+@cloup.argument(
+    "current",
+    type=cloup.Path(exists=True, dir_okay=False, path_type=Path),
+)
+@cloup.option(
+    "-t",
+    "--threshold",
+    type=float,
+    default=0.1,
+    show_default=True,
+    help="Relative slowdown above which a benchmark is flagged as a regression.",
+)
+def bench_compare(
+    baseline: Path,
+    current: Path,
+    threshold: float,
+):
+    """
+    Compare benchmark results with a baseline, exiting with
+    an error if any benchmark has regressed.
+    """
+    from mimetica.bench import suite
+
+    rows = suite.compare(suite.load(baseline), suite.load(current), threshold)
+    if _report_comparison(rows) > 0:
+        sys.exit(1)
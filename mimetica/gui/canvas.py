@@ -3,19 +3,31 @@ from PySide6.QtCore import Slot
 from PySide6.QtCore import Signal
 from PySide6.QtCore import QEvent
 from PySide6.QtCore import QObject
+from PySide6.QtCore import QTimer
 
 from PySide6.QtGui import QKeyEvent
 from PySide6.QtGui import QMouseEvent
 from PySide6.QtGui import QEnterEvent
+from PySide6.QtGui import QIcon
+from PySide6.QtGui import QKeySequence
+from PySide6.QtGui import QShortcut
 
 from PySide6.QtWidgets import QWidget
 from PySide6.QtWidgets import QGridLayout
 from PySide6.QtWidgets import QHBoxLayout
 from PySide6.QtWidgets import QScrollArea
 from PySide6.QtWidgets import QSizePolicy
+from PySide6.QtWidgets import QSlider
+from PySide6.QtWidgets import QToolButton
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+
+import bisect
+import functools
 
 import numpy as np
-import skimage as ski
 
 import shapely as shp
 import pyqtgraph as pg
@@ -27,15 +39,26 @@ from mimetica import ImageView
 from mimetica import Layer
 from mimetica import Stack
 from mimetica import conf
+from mimetica import logger
 from mimetica.gui.roi.contour import Contour
 from mimetica.gui.roi.target import Target
 
 
+# Maximal size of the cached renders of the layers (in bytes)
+RENDER_CACHE_SIZE = 256 * 2**20
+
+# Number of layers ahead of the active one (in the direction of
+# scrubbing or playback) that are rendered in the background
+PREFETCH_LAYERS = 4
+
+
 class Canvas(QWidget):
     plot = Signal()
     highlight_plot = Signal(int)
     update_radial_plot = Signal(float)
     update_phase_plot = Signal(float)
+    _prerendered = Signal(int, int, object)
+    _prerender_failed = Signal(int, int)
 
     class EventHandler(QObject):
 
@@ -81,6 +104,29 @@ class Canvas(QWidget):
         self.layer_mbcs = []
         self.phase_resolution = 1
 
+        # Rendered layers
+        # ==================================================
+        # Each layer is rendered once as an 8-bit image, where 255 marks
+        # the material of the layer and 0-254 the level of the projection
+        # of the stack underneath it. The colours are applied by a lookup
+        # table, so changing them does not render the layers again.
+        self._renders: OrderedDict[int, np.ndarray] = OrderedDict()
+        self._render_bytes = 0
+        self._render_key = None
+        self._projection_levels = None
+
+        # Layers are rendered ahead of time in a background thread.
+        # Renders are only cached if no renders have been discarded
+        # since they were started (i.e., the generation is the same).
+        self._render_generation = 0
+        self._prefetching: set[int] = set()
+        # The active layer and the layers prefetched around it,
+        # whose renders are not evicted to make room for others.
+        self._window: set[int] = set()
+        self._prefetcher: ThreadPoolExecutor | None = ThreadPoolExecutor(max_workers=2)
+        self._prerendered.connect(self._cache_prerender)
+        self._prerender_failed.connect(self._drop_prerender)
+
         # Layout grid
         # ==================================================
         self.grid = QGridLayout(self)
@@ -88,7 +134,7 @@ class Canvas(QWidget):
 
         # Thumbnails
         # ==================================================
-        self.thumbnails = []
+        self.thumbnails: dict[int, Thumbnail] = {}
         self.tb_widget = QWidget()
         self.tb_scroll_area = QScrollArea(self)
         self.tb_layout = QHBoxLayout()
@@ -121,6 +167,45 @@ class Canvas(QWidget):
 
         self.grid.addWidget(self.tb_scroll_area, 1, 0, 1, 2)
 
+        # Cine controls
+        # ==================================================
+        self.cine_button = QToolButton(self)
+        self.cine_button.setIcon(QIcon.fromTheme("media-playback-start"))
+        self.cine_button.setToolTip("Play through the layers")
+        self.cine_button.clicked.connect(self.toggle_playback)
+
+        self.cine_slider = QSlider(Qt.Orientation.Horizontal, self)
+        self.cine_slider.setRange(0, 0)
+        self.cine_slider.valueChanged.connect(self._scrub)
+
+        self.cine_layout = QHBoxLayout()
+        self.cine_layout.addWidget(self.cine_button)
+        self.cine_layout.addWidget(self.cine_slider)
+        self.grid.addLayout(self.cine_layout, 2, 0, 1, 2)
+
+        self.cine_timer = QTimer(self)
+        self.cine_timer.timeout.connect(lambda: self.step_layer(1, wrap=True))
+        self.set_cine_rate(conf.cine_rate)
+
+        # The mouse wheel over the thumbnails scrubs through the layers
+        self.tb_scroll_area.viewport().installEventFilter(self)
+
+        # Keyboard shortcuts for scrubbing
+        # ==================================================
+        shortcuts = {
+            Qt.Key.Key_Right: lambda: self.step_layer(1),
+            Qt.Key.Key_Left: lambda: self.step_layer(-1),
+            Qt.Key.Key_PageDown: lambda: self.step_layer(10),
+            Qt.Key.Key_PageUp: lambda: self.step_layer(-10),
+            Qt.Key.Key_End: lambda: self.step_layer(len(self.stack.layers)),
+            Qt.Key.Key_Home: lambda: self.step_layer(-len(self.stack.layers)),
+            Qt.Key.Key_Space: self.toggle_playback,
+        }
+        for (key, slot) in shortcuts.items():
+            shortcut = QShortcut(QKeySequence(key), self)
+            shortcut.setContext(Qt.ShortcutContext.WidgetWithChildrenShortcut)
+            shortcut.activated.connect(slot)
+
         # Slots, signals and proxies
         # ==================================================
 
@@ -150,16 +235,21 @@ class Canvas(QWidget):
         # Update the stack
         # ==================================================
         self.stack = stack
-        if len(self.stack.layers) > 0:
-            self.stack._set_active_layer()
+        self._clear_renders()
 
         # Update the thumbnails
         # ==================================================
         self._update_thumbnails()
 
-        # Select the first layer
+        # Update the range of the slider
         # ==================================================
-        self.slot_select_layer(0, auto_range)
+        self.cine_slider.blockSignals(True)
+        self.cine_slider.setRange(0, len(self.stack.layers) - 1)
+        self.cine_slider.blockSignals(False)
+
+        # Select the active layer
+        # ==================================================
+        self.slot_select_layer(self.stack.active_layer, auto_range)
 
     def process(
         self,
@@ -185,25 +275,9 @@ class Canvas(QWidget):
         # ==================================================
         lcx, lcy = self.layer.centre
 
-        # Reset the canvas
-        # ==================================================
-        self.image = np.zeros(self.layer.canvas.shape + (4,))
-
-        # Draw the slice and potentially the stack
+        # Render the slice and the projection of the stack underneath it
         # ==================================================
-        idx = np.argwhere(self.layer.canvas > 0).T
-        self.image[idx[0], idx[1], :3] = ski.exposure.rescale_intensity(
-            self.layer.canvas[idx[0], idx[1], None],
-            out_range=(0.0, 1.0),
-        ) * np.array(
-            [
-                conf.active_layer_colour.red(),
-                conf.active_layer_colour.green(),
-                conf.active_layer_colour.blue(),
-            ]
-        )
-
-        self.image[idx[0], idx[1], 3] = conf.active_layer_colour.alpha()
+        self.image = self._render(self.stack.active_layer)
 
         # Draw the centre
         # ==================================================
@@ -229,8 +303,261 @@ class Canvas(QWidget):
         # Set the image
         # ==================================================
         self.iv.setImage(
-            self.image, autoRange=auto_range, levels=(0, 255), levelMode="rgba"
+            self.image,
+            autoRange=auto_range,
+            autoLevels=False,
+            levels=(0, 255),
+            autoHistogramRange=False,
         )
+        self._apply_colours()
+
+    def _apply_colours(self):
+        """
+        Colour the rendered layer with a lookup table: 255 is mapped to
+        the colour of the active layer and 0-254 to the colour of the
+        projection of the stack, scaled by the level of the projection.
+        """
+        lut = np.zeros((256, 4), dtype=np.uint8)
+
+        colour = conf.inactive_layer_colour
+        levels = np.linspace(0.0, 1.0, 255)[:, None]
+        lut[:255] = np.rint(
+            levels * np.array([colour.red(), colour.green(), colour.blue(), colour.alpha()])
+        )
+
+        colour = conf.active_layer_colour
+        lut[255] = [colour.red(), colour.green(), colour.blue(), colour.alpha()]
+
+        self.iv.imageItem.setLookupTable(lut)
+
+    def _projection_key(self) -> tuple | None:
+        """
+        Identify the projection drawn underneath the layers.
+
+        Returns:
+            The mode and the identity of the projection,
+            or None if no projection is drawn.
+        """
+        if not conf.show_stack or self.stack.projection is None:
+            return None
+        return (conf.projection_mode, id(self.stack.projection))
+
+    def _clear_renders(self):
+        self._renders.clear()
+        self._render_bytes = 0
+        self._render_key = None
+        self._projection_levels = None
+        self._render_generation += 1
+        self._prefetching.clear()
+        self._window.clear()
+
+    def _update_render_key(self):
+        """
+        Discard the renders if the projection drawn
+        underneath the layers has changed.
+        """
+        key = self._projection_key()
+        if key != self._render_key or (key is not None and self._projection_levels is None):
+            self._clear_renders()
+            self._render_key = key
+            if key is not None:
+                self._projection_levels = np.rint(
+                    254 * self.stack.projection.image(conf.projection_mode, normalise=True)
+                ).astype(np.uint8)
+
+    @staticmethod
+    def _compose(
+        layer: Layer,
+        levels: np.ndarray | None,
+    ) -> np.ndarray:
+        """
+        Render a layer on top of the projection of the stack.
+
+        Args:
+            layer: The layer.
+            levels: Levels (0-254) of the projection, if it is drawn.
+
+        Returns:
+            The render as an 8-bit image.
+        """
+        mask = layer.mask.unpack()
+        render = np.zeros(mask.shape, dtype=np.uint8)
+
+        # The projection is cropped to the extent of the layer
+        if levels is not None:
+            rows = min(levels.shape[0], render.shape[0])
+            cols = min(levels.shape[1], render.shape[1])
+            render[:rows, :cols] = levels[:rows, :cols]
+        render[mask] = 255
+
+        return render
+
+    def _cache_render(
+        self,
+        index: int,
+        render: np.ndarray,
+    ):
+        self._renders[index] = render
+        self._render_bytes += render.nbytes
+
+        # The least recently used renders outside the window are evicted
+        while self._render_bytes > RENDER_CACHE_SIZE:
+            evicted = next(
+                (
+                    key
+                    for key in self._renders
+                    if key != index and key not in self._window
+                ),
+                None,
+            )
+            if evicted is None:
+                break
+            self._render_bytes -= self._renders.pop(evicted).nbytes
+
+    def _render(
+        self,
+        index: int,
+    ) -> np.ndarray:
+        """
+        Render a layer, reusing the cached render if there is one.
+
+        The least recently used renders are evicted once the cache
+        exceeds `RENDER_CACHE_SIZE`, except for the active layer and
+        the layers prefetched around it (see `_prefetch`). All renders
+        are discarded when the projection drawn underneath them changes.
+
+        Args:
+            index: Index of the layer.
+
+        Returns:
+            The render as an 8-bit image.
+        """
+        self._update_render_key()
+
+        render = self._renders.get(index)
+        if render is not None:
+            self._renders.move_to_end(index)
+            return render
+
+        render = self._compose(self.stack.layers[index], self._projection_levels)
+        self._cache_render(index, render)
+
+        return render
+
+    def _prefetch(
+        self,
+        index: int,
+        direction: int = 1,
+    ):
+        """
+        Render the layers around a layer in the background, mostly those
+        ahead of it in the direction of scrubbing or playback.
+
+        The renders are cached when they are finished (in `_cache_prerender`).
+        The layer and the prefetched layers form a window whose renders
+        are kept in the cache, while the renders outside the window are
+        evicted as needed. The window is limited to the size of the cache,
+        so that the prefetched renders do not evict each other.
+
+        Args:
+            index: Index of the layer.
+            direction: Direction of scrubbing (1 or -1).
+        """
+        # The canvas has been closed
+        if self._prefetcher is None:
+            return
+
+        self._update_render_key()
+
+        targets = [index + direction * step for step in range(1, PREFETCH_LAYERS + 1)]
+        targets.append(index - direction)
+
+        layers = self.stack.layers
+        self._window = {index}
+        budget = RENDER_CACHE_SIZE
+        if layers[index] is not None:
+            budget -= int(np.prod(layers[index].shape))
+        for target in targets:
+            if not 0 <= target < len(layers) or layers[target] is None:
+                continue
+
+            budget -= int(np.prod(layers[target].shape))
+            if budget < 0:
+                break
+
+            self._window.add(target)
+            if target in self._renders or target in self._prefetching:
+                continue
+
+            self._prefetching.add(target)
+            future = self._prefetcher.submit(
+                self._prerender,
+                target,
+                layers[target],
+                self._projection_levels,
+                self._render_generation,
+            )
+            future.add_done_callback(
+                functools.partial(self._prerender_done, target, self._render_generation)
+            )
+
+    def _prerender(
+        self,
+        index: int,
+        layer: Layer,
+        levels: np.ndarray | None,
+        generation: int,
+    ):
+        # Runs in the background thread, so the
+        # render is handed over to the GUI thread.
+        self._prerendered.emit(index, generation, self._compose(layer, levels))
+
+    @Slot(int, int, object)
+    def _cache_prerender(
+        self,
+        index: int,
+        generation: int,
+        render: np.ndarray,
+    ):
+        if generation != self._render_generation:
+            return
+
+        self._prefetching.discard(index)
+        if index not in self._renders:
+            self._cache_render(index, render)
+
+    def _prerender_done(
+        self,
+        index: int,
+        generation: int,
+        future: Future,
+    ):
+        # Runs in the background thread (or in the GUI thread if the
+        # render has already finished), so a failure is handed over
+        # to the GUI thread, which can prefetch the layer again.
+        if future.cancelled() or future.exception() is None:
+            return
+
+        logger.opt(exception=future.exception()).error(f"Failed to render layer {index}")
+        self._prerender_failed.emit(index, generation)
+
+    @Slot(int, int)
+    def _drop_prerender(
+        self,
+        index: int,
+        generation: int,
+    ):
+        if generation == self._render_generation:
+            self._prefetching.discard(index)
+
+    def closeEvent(self, event):
+        # Stop playback and drop the layers that are still to be prefetched.
+        # The renders in progress are waited for, since they read the masks.
+        self.cine_timer.stop()
+        if self._prefetcher is not None:
+            self._prefetcher.shutdown(wait=True, cancel_futures=True)
+            self._prefetcher = None
+        super().closeEvent(event)
 
     def _update_thumbnails(self):
         while True:
@@ -241,21 +568,46 @@ class Canvas(QWidget):
             item.widget().deleteLater()
 
         self.thumbnails.clear()
-        for index, layer in enumerate(self.stack.layers):
-            tb = Thumbnail(index, layer, self, 90)
-            tb._selected.connect(self.slot_select_layer)
-            self.thumbnails.append(tb)
-
-        for idx, tb in enumerate(self.thumbnails):
-            self.tb_layout.addWidget(tb, alignment=Qt.AlignmentFlag.AlignLeft)
-
         self.tb_layout.addStretch()
+        for index in self.stack.loaded_layers:
+            self.add_thumbnail(index)
+
+    @Slot(int)
+    def add_thumbnail(
+        self,
+        index: int,
+    ):
+        """
+        Add the thumbnail of a layer that has just been loaded.
+        Thumbnails are kept in the order of the layers
+        regardless of the order in which they are added.
+
+        Args:
+            index: Index of the layer.
+        """
+        if index in self.thumbnails:
+            return
+
+        tb = Thumbnail(index, self.stack.layers[index], self, 90)
+        tb._selected.connect(self.show_layer)
+
+        position = sum(1 for idx in self.thumbnails if idx < index)
+        self.thumbnails[index] = tb
+        self.tb_layout.insertWidget(
+            position, tb, alignment=Qt.AlignmentFlag.AlignLeft
+        )
 
     @Slot()
     def _reset_zoom(self):
         self.draw(auto_range=True)
 
     def eventFilter(self, obj, event):
+        if obj is self.tb_scroll_area.viewport() and event.type() == QEvent.Wheel:
+            delta = event.angleDelta()
+            step = delta.y() if delta.y() != 0 else delta.x()
+            if step != 0 and self.stack is not None:
+                self.step_layer(-1 if step > 0 else 1)
+            return True
         if obj is self.window:
             if event.type() == QEvent.KeyPress:
                 if event.key() == Qt.Key_Control:
@@ -312,7 +664,16 @@ class Canvas(QWidget):
 
     @Slot()
     def _set_active_layer_colour(self):
-        self.draw()
+        self._apply_colours()
+
+    @Slot()
+    def _set_inactive_layer_colour(self):
+        self._apply_colours()
+
+    @Slot()
+    def _show_stack(self):
+        if self.stack is not None:
+            self.draw()
 
     @Slot()
     def _set_slice_contour_colour(self):
@@ -333,7 +694,8 @@ class Canvas(QWidget):
         self.stack._set_active_layer(layer)
 
         # Highlight the selected thumbnail
-        self.thumbnails[cur_layer].deselect()
+        if cur_layer in self.thumbnails:
+            self.thumbnails[cur_layer].deselect()
         self.thumbnails[layer].select()
 
         # Process the layer
@@ -341,3 +703,127 @@ class Canvas(QWidget):
 
         # Emit a signal to highlight the relevant plots
         self.highlight_plot.emit(layer)
+
+        self._sync_slider()
+        self._prefetch(layer)
+
+    @Slot(int)
+    def show_layer(
+        self,
+        layer: int,
+    ):
+        """
+        Switch to another layer while scrubbing or playing through the stack.
+
+        Unlike `slot_select_layer`, the profiles are not plotted again.
+        Only the highlight of the active profiles is moved, and the layer
+        is drawn from its cached render where possible. The layers
+        next to it are then rendered in the background.
+
+        Args:
+            layer: Index of the layer.
+        """
+        cur_layer = self.stack.active_layer
+        if layer == cur_layer or self.stack.layers[layer] is None:
+            return
+
+        # Update the layer
+        self.stack._set_active_layer(layer)
+
+        # Highlight the selected thumbnail
+        if cur_layer in self.thumbnails:
+            self.thumbnails[cur_layer].deselect()
+        if layer in self.thumbnails:
+            self.thumbnails[layer].select()
+            self.tb_scroll_area.ensureWidgetVisible(self.thumbnails[layer])
+
+        # Draw the layer and move the ROI
+        self.draw()
+        self.iv.set_roi(self.layer)
+
+        # Highlight the profiles of the layer
+        self.highlight_plot.emit(layer)
+
+        self._sync_slider()
+        self._prefetch(layer, 1 if cur_layer is None or layer > cur_layer else -1)
+
+    def step_layer(
+        self,
+        step: int,
+        wrap: bool = False,
+    ):
+        """
+        Move a number of loaded layers forwards or backwards.
+        Layers that have not been loaded yet are skipped.
+
+        Args:
+            step: Number of layers (negative to move backwards).
+            wrap: Wrap around at the ends of the stack
+                (otherwise stop at the first or last layer).
+        """
+        if self.stack is None or self.stack.active_layer is None:
+            return
+
+        loaded = list(self.stack.loaded_layers)
+        if len(loaded) == 0:
+            return
+
+        position = bisect.bisect_left(loaded, self.stack.active_layer) + step
+        if wrap:
+            position %= len(loaded)
+        else:
+            position = min(max(position, 0), len(loaded) - 1)
+
+        self.show_layer(loaded[position])
+
+    @Slot(int)
+    def _scrub(
+        self,
+        value: int,
+    ):
+        if self.stack is None:
+            return
+
+        # Show the closest layer that has been loaded
+        loaded = list(self.stack.loaded_layers)
+        if len(loaded) == 0:
+            return
+
+        position = bisect.bisect_left(loaded, value)
+        candidates = loaded[max(position - 1, 0) : position + 1]
+        self.show_layer(min(candidates, key=lambda index: abs(index - value)))
+
+    def _sync_slider(self):
+        self.cine_slider.blockSignals(True)
+        self.cine_slider.setValue(self.stack.active_layer)
+        self.cine_slider.blockSignals(False)
+
+    @Slot()
+    def toggle_playback(self):
+        """
+        Start or stop playing through the layers of the stack.
+        """
+        if self.cine_timer.isActive():
+            self.cine_timer.stop()
+            self.cine_button.setIcon(QIcon.fromTheme("media-playback-start"))
+            self.cine_button.setToolTip("Play through the layers")
+        elif self.stack is not None:
+            self.cine_timer.start()
+            self.cine_button.setIcon(QIcon.fromTheme("media-playback-pause"))
+            self.cine_button.setToolTip("Pause")
+
+    @Slot(int)
+    def set_cine_rate(
+        self,
+        rate: int,
+    ):
+        """
+        Set the frame rate of the playback.
+
+        If a layer takes longer to show than a frame,
+        the playback slows down rather than queueing frames.
+
+        Args:
+            rate: Frames per second.
+        """
+        self.cine_timer.setInterval(max(1, round(1000 / rate)))
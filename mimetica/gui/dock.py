@@ -7,13 +7,14 @@ from PySide6.QtWidgets import QDockWidget
 from PySide6.QtWidgets import QPushButton
 from PySide6.QtWidgets import QCheckBox
 from PySide6.QtWidgets import QSpinBox
+from PySide6.QtWidgets import QComboBox
 from PySide6.QtWidgets import QLabel
 from PySide6.QtWidgets import QFormLayout
 from PySide6.QtWidgets import QSizePolicy
 
 from mimetica import conf
-from mimetica.utils.functions import as_rgba
-from mimetica.utils.functions import get_colour
+from mimetica.utils.colours import as_rgba
+from mimetica.utils.colours import get_colour
 
 
 class Dock(QDockWidget):
@@ -22,9 +23,12 @@ class Dock(QDockWidget):
     sig_set_inactive_plot_colour = Signal()
     sig_set_layer_contour_colour = Signal()
     sig_set_active_layer_colour = Signal()
-    # sig_show_stack = Signal()
+    sig_set_inactive_layer_colour = Signal()
+    sig_show_stack = Signal()
+    sig_set_projection_mode = Signal()
     sig_set_radial_segments = Signal(int)
     sig_set_phase_segments = Signal(int)
+    sig_set_cine_rate = Signal(int)
 
     def __init__(self, *args, **kwargs):
 
@@ -96,14 +100,36 @@ class Dock(QDockWidget):
             self._slot_set_slice_contour_colour
         )
 
-        # DEPRECATED
         # Show the stack
         # ==================================================
-        # self.show_stack_lbl = QLabel(f"Show the stack:", self)
-        # self.show_stack_cbox = QCheckBox(self)
-        # self.show_stack_cbox.setChecked(conf.show_stack)
-        # self.grid.addRow(self.show_stack_lbl, self.show_stack_cbox)
-        # self.show_stack_cbox.stateChanged.connect(self._slot_show_stack)
+        self.show_stack_lbl = QLabel(f"Show the stack:", self)
+        self.show_stack_cbox = QCheckBox(self)
+        self.show_stack_cbox.setChecked(conf.show_stack)
+        self.grid.addRow(self.show_stack_lbl, self.show_stack_cbox)
+        self.show_stack_cbox.stateChanged.connect(self._slot_show_stack)
+
+        # Stack projection mode
+        # ==================================================
+        self.projection_mode_lbl = QLabel(f"Stack projection:", self)
+        self.projection_mode_cbox = QComboBox(self)
+        self.projection_mode_cbox.addItems(["mean", "max", "sum"])
+        self.projection_mode_cbox.setCurrentText(conf.projection_mode)
+        self.grid.addRow(self.projection_mode_lbl, self.projection_mode_cbox)
+        self.projection_mode_cbox.currentTextChanged.connect(
+            self._slot_set_projection_mode
+        )
+
+        # Stack colour
+        # ==================================================
+        self.inactive_layer_colour_lbl = QLabel(f"Stack colour:", self)
+        self.inactive_layer_colour_btn = QPushButton(self)
+        self.inactive_layer_colour_btn.setStyleSheet(
+            f"background-color:rgba({as_rgba(conf.inactive_layer_colour)});"
+        )
+        self.grid.addRow(self.inactive_layer_colour_lbl, self.inactive_layer_colour_btn)
+        self.inactive_layer_colour_btn.pressed.connect(
+            self._slot_set_inactive_layer_colour
+        )
 
         # Radial segments
         # ==================================================
@@ -133,6 +159,21 @@ class Dock(QDockWidget):
         self.grid.addRow(self.phase_segments_lbl, self.phase_segments_sbox)
         self.phase_segments_sbox.valueChanged.connect(self._slot_set_phase_segments)
 
+        # Playback rate
+        # ==================================================
+        self.cine_rate_lbl = QLabel(f"Playback rate:", self)
+        self.cine_rate_sbox = QSpinBox(
+            self,
+            value=conf.cine_rate,
+            minimum=1,
+            maximum=120,
+            singleStep=1,
+            suffix=" fps",
+        )
+        self.cine_rate_sbox.setValue(conf.cine_rate)
+        self.grid.addRow(self.cine_rate_lbl, self.cine_rate_sbox)
+        self.cine_rate_sbox.valueChanged.connect(self._slot_set_cine_rate)
+
         # Set up the main widget
         # ==================================================
         self.body = QWidget()
@@ -185,10 +226,25 @@ class Dock(QDockWidget):
                 f"background-color:rgba({as_rgba(colour)});"
             )
 
-    # @Slot()
-    # def _slot_show_stack(self):
-    #     conf.show_stack = self.show_stack_cbox.isChecked()
-    #     self.sig_show_stack.emit()
+    @Slot()
+    def _slot_set_inactive_layer_colour(self):
+        colour = get_colour(conf.inactive_layer_colour, self)
+        if colour.isValid():
+            conf.inactive_layer_colour = colour
+            self.sig_set_inactive_layer_colour.emit()
+            self.inactive_layer_colour_btn.setStyleSheet(
+                f"background-color:rgba({as_rgba(colour)});"
+            )
+
+    @Slot()
+    def _slot_show_stack(self):
+        conf.show_stack = self.show_stack_cbox.isChecked()
+        self.sig_show_stack.emit()
+
+    @Slot()
+    def _slot_set_projection_mode(self):
+        conf.projection_mode = self.projection_mode_cbox.currentText()
+        self.sig_set_projection_mode.emit()
 
     @Slot()
     def _slot_set_radial_segments(self):
@@ -199,3 +255,8 @@ class Dock(QDockWidget):
     def _slot_set_phase_segments(self):
         conf.phase_samples = self.phase_segments_sbox.value()
         self.sig_set_phase_segments.emit(conf.phase_samples)
+
+    @Slot()
+    def _slot_set_cine_rate(self):
+        conf.cine_rate = self.cine_rate_sbox.value()
+        self.sig_set_cine_rate.emit(conf.cine_rate)
@@ -8,15 +8,12 @@ from PySide6.QtGui import QAction
 from PySide6.QtGui import QKeySequence
 from PySide6.QtCore import Slot
 
-import cloup
-import platform
-import multiprocessing as mp
-
 from pathlib import Path
 
-from mimetica import conf
-from mimetica import logger
 from mimetica import Tab
+from mimetica.scan import pipeline
+from mimetica.scan import volume
+from mimetica.scan.volume import Page
 
 import pyqtgraph
 pyqtgraph.setConfigOptions(
@@ -109,30 +106,10 @@ class MainWindow(QMainWindow):
             return
 
         elif isinstance(path, (str, Path)):
-            path = Path(path)
-            if path.is_file():
-                paths = [path]
-
-            else:
-                paths = []
-                extensions = {
-                    ".bmp",
-                    ".tif",
-                    ".tiff",
-                    ".png",
-                    ".jpg",
-                    ".jpeg",
-                }
-
-                for file in path.iterdir():
-                    if str(file).startswith("."):
-                        continue
-
-                    if file.suffix.lower() in extensions:
-                        paths.append(file.resolve().absolute())
+            paths = pipeline.find_images(path)
 
         elif isinstance(path, list):
-            paths = [Path(p) for p in path]
+            paths = volume.expand([Path(p) for p in path])
 
         else:
             raise TypeError(f"Invalid path type: {type(path)}")
@@ -146,52 +123,34 @@ class MainWindow(QMainWindow):
         pos: int,
     ):
         if pos < self.tabs.count():
+            tab = self.tabs.widget(pos)
             self.tabs.removeTab(pos)
+            tab.close()
 
     def _add_tab(
         self,
-        paths: list[Path],
+        paths: list[Path | Page],
     ):
         tab = Tab(paths)
-        name = paths[0].parent.name
+        if isinstance(paths[0], Page):
+            name = paths[0].path.stem
+        else:
+            name = paths[0].parent.name
         idx = self.tabs.addTab(tab, name)
         self.tabs.setCurrentIndex(idx)
 
 
-@cloup.command()
-@cloup.option_group(
-    "Input",
-    "Open one or more images.",
-    cloup.option(
-        "-i",
-        "--image",
-        type=str,
-        default=None,
-        help="Open a single image.",
-    ),
-    cloup.option(
-        "-s",
-        "--stack",
-        type=str,
-        default=None,
-        help="Open a stack (directory of images).",
-    ),
-    constraint=cloup.constraints.mutually_exclusive
-)
-def run(
-    image: str | None,
-    stack: str | None,
+def main(
+    image: str | None = None,
+    stack: str | None = None,
 ):
+    """
+    Start the GUI.
 
-    # Set the multiprocessing context
-    plt = platform.system()
-    logger.warning(f"Running on {plt}")
-    if plt.lower() == "windows":
-        mp.set_start_method("spawn")
-    else:
-        mp.set_start_method("forkserver")
-
-    # The main feature
+    Args:
+        image: Optional image to open.
+        stack: Optional stack to open.
+    """
     app = QApplication(sys.argv)
     mw = MainWindow()
 
@@ -0,0 +1,134 @@
+from PySide6.QtCore import Slot
+from PySide6.QtCore import Signal
+from PySide6.QtCore import QObject
+from PySide6.QtCore import QTimer
+
+from mimetica import Stack
+
+
+class Scheduler(QObject):
+    """
+    Coalesces rapid changes to the number of radial and phase segments
+    into a single recomputation of the profiles of all layers.
+
+    Every new request cancels the recomputation in progress (if any),
+    and a new one is started only once the requests have stopped
+    arriving for `delay` milliseconds. The profiles are recomputed by
+    the worker pool of the stack, and only the result of the latest
+    request is published.
+    """
+
+    progress = Signal(int, int)
+    finished = Signal()
+
+    def __init__(
+        self,
+        stack: Stack,
+        delay: int = 250,
+        *args,
+        **kwargs,
+    ):
+        """
+        Create a scheduler.
+
+        Args:
+            stack: The stack whose profiles are recomputed.
+            delay: Time (in ms) to wait for further requests before recomputing.
+        """
+        super().__init__(*args, **kwargs)
+
+        self.stack = stack
+
+        # Pending changes
+        # ==================================================
+        self.radial_segments = None
+        self.phase_segments = None
+
+        # Number of layers updated by the current recomputation
+        # and the number of layers that it covers
+        # ==================================================
+        self.done = 0
+        self.total = 0
+
+        # Debounce timer
+        # ==================================================
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self._start)
+
+        # Slots and signals
+        # ==================================================
+        self.stack.update_profile.connect(self._update_progress)
+        self.stack.plot.connect(self._finish)
+
+    @Slot(int)
+    def set_radial_segments(
+        self,
+        segments: int,
+    ):
+        """
+        Request a new number of radial segments.
+
+        Args:
+            segments: Number of radial segments.
+        """
+        self.radial_segments = segments
+        self._schedule()
+
+    @Slot(int)
+    def set_phase_segments(
+        self,
+        segments: int,
+    ):
+        """
+        Request a new number of phase segments.
+
+        Args:
+            segments: Number of phase segments.
+        """
+        self.phase_segments = segments
+        self._schedule()
+
+    def _schedule(self):
+        """
+        Cancel the recomputation in progress and (re)start the debounce timer.
+        """
+        self.stack._cancel_profiles()
+        self.timer.start()
+
+    @Slot()
+    def _start(self):
+        """
+        Start recomputing the profiles with the latest requested segments.
+        """
+        self.done = 0
+        self.stack._compute_profiles(self.radial_segments, self.phase_segments)
+        self.total = self.stack._pending
+        if self.total == 0:
+            # No layers have been loaded yet, so the layers
+            # pick up the new segments when they are added.
+            self.radial_segments = None
+            self.phase_segments = None
+            return
+
+        self.progress.emit(self.done, self.total)
+
+    @Slot(int)
+    def _update_progress(
+        self,
+        index: int,
+    ):
+        self.done += 1
+        self.progress.emit(self.done, self.total)
+
+    @Slot()
+    def _finish(self):
+        """
+        Publish the result. Pending changes are kept until a
+        recomputation completes since a cancelled one may have
+        updated only some of the layers.
+        """
+        self.radial_segments = None
+        self.phase_segments = None
+        self.finished.emit()
@@ -128,6 +128,10 @@ class SplitView(QSplitter):
         # Plot all layers
         # ==================================================
         for idx, layer in enumerate(layers):
+            if layer is None:
+                # Not loaded yet
+                continue
+
             if idx == current_layer_idx:
                 pen = self.active_plot_pen
                 self.current_layer_idx = idx
@@ -157,21 +161,90 @@ class SplitView(QSplitter):
                     pen=pen,
                 )
 
-            if idx == current_layer_idx:
-                self.radial_arrow = pg.CurveArrow(self.radial_plots[idx])
-                self.radial_arrow.setRotation(270)
-                self.radial_arrow._rotate = False
-                self.phase_arrow = pg.CurveArrow(self.phase_plots[idx])
-                self.phase_arrow.setRotation(270)
-                self.phase_arrow._rotate = False
-
         # Add vertical guides
         # ==================================================
         self.radial_graph.addItem(self.radial_guide)
-        self.radial_graph.addItem(self.radial_arrow)
         self.phase_graph.addItem(self.phase_guide)
+        self._place_arrows()
+
+    def _place_arrows(self):
+        """
+        Attach the arrows marking the positions of the
+        guides to the profiles of the current layer.
+        """
+        idx = self.current_layer_idx
+        if idx not in self.radial_plots or idx not in self.phase_plots:
+            return
+
+        if self.radial_arrow is not None:
+            self.radial_graph.removeItem(self.radial_arrow)
+        self.radial_arrow = pg.CurveArrow(self.radial_plots[idx])
+        self.radial_arrow.setRotation(270)
+        self.radial_arrow._rotate = False
+        self.radial_graph.addItem(self.radial_arrow)
+
+        if self.phase_arrow is not None:
+            self.phase_graph.removeItem(self.phase_arrow)
+        self.phase_arrow = pg.CurveArrow(self.phase_plots[idx])
+        self.phase_arrow.setRotation(270)
+        self.phase_arrow._rotate = False
         self.phase_graph.addItem(self.phase_arrow)
 
+        # Keep the arrows at the positions of the guides
+        layer = self.current_layer
+        if layer.radial_range is not None and len(layer.radial_range) > 0:
+            index = np.absolute(layer.radial_range - self.radial_guide.value()).argmin()
+            self.radial_arrow.setIndex(int(index))
+        if layer.phase_range is not None and len(layer.phase_range) > 0:
+            index = np.absolute(layer.phase_range - self.phase_guide.value()).argmin()
+            self.phase_arrow.setIndex(int(index))
+
+    @Slot(int)
+    def _add_plot(
+        self,
+        idx: int,
+    ):
+        """
+        Plot the profiles of a layer that has just been loaded.
+
+        Args:
+            idx: Index of the layer.
+        """
+        if idx in self.radial_plots:
+            self._update_plot(idx)
+            return
+
+        layer = self.canvas.stack.layers[idx]
+        pen = (
+            self.inactive_plot_pen
+            if conf.show_inactive_plots
+            else self.invisible_plot_pen
+        )
+
+        self.radial_plots[idx] = self.radial_graph.plot(
+            layer.radial_range,
+            layer.radial_profile,
+            pen=pen,
+        )
+        self.phase_plots[idx] = self.phase_graph.plot(
+            layer.phase_range,
+            layer.phase_profile,
+            pen=pen,
+        )
+
+    @Slot(int)
+    def _update_plot(
+        self,
+        idx: int,
+    ):
+        layer = self.canvas.stack.layers[idx]
+
+        if idx in self.radial_plots:
+            self.radial_plots[idx].setData(layer.radial_range, layer.radial_profile)
+
+        if idx in self.phase_plots:
+            self.phase_plots[idx].setData(layer.phase_range, layer.phase_profile)
+
     @Slot(float, str)
     def _update_radial_position(
         self,
@@ -251,15 +324,40 @@ class SplitView(QSplitter):
         self,
         layer_idx: int,
     ):
-
-        self.radial_plots[self.current_layer_idx].setPen(self.inactive_plot_pen)
+        """
+        Highlight the profiles of another layer.
+
+        Only the pens of the previous and the new active profiles
+        change, so the other profiles are not plotted again.
+
+        Args:
+            layer_idx: Index of the layer.
+        """
+        if layer_idx not in self.radial_plots or layer_idx not in self.phase_plots:
+            return
+
+        previous = self.current_layer_idx
+        if previous != layer_idx and previous in self.radial_plots:
+            pen = (
+                self.inactive_plot_pen
+                if conf.show_inactive_plots
+                else self.invisible_plot_pen
+            )
+            self.radial_plots[previous].setPen(pen)
+            self.radial_plots[previous].setZValue(0)
+            self.phase_plots[previous].setPen(pen)
+            self.phase_plots[previous].setZValue(0)
+
+        # The active profiles are drawn on top of the others
         self.radial_plots[layer_idx].setPen(self.active_plot_pen)
-        self.radial_plots[layer_idx].update()
+        self.radial_plots[layer_idx].setZValue(1)
         self.radial_graph.getPlotItem().enableAutoRange()
 
-        self.phase_plots[self.current_layer_idx].setPen(self.inactive_plot_pen)
         self.phase_plots[layer_idx].setPen(self.active_plot_pen)
-        self.phase_plots[layer_idx].update()
+        self.phase_plots[layer_idx].setZValue(1)
         self.phase_graph.getPlotItem().enableAutoRange()
 
         self.current_layer_idx = layer_idx
+        self.current_layer = self.canvas.stack.layers[layer_idx]
+        if previous != layer_idx:
+            self._place_arrows()
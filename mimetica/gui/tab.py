@@ -18,6 +18,8 @@ from mimetica import Canvas
 from mimetica import Dock
 from mimetica import SplitView
 from mimetica import Stack
+from mimetica import Scheduler
+from mimetica.scan.volume import Page
 
 
 class Tab(QMainWindow):
@@ -25,7 +27,7 @@ class Tab(QMainWindow):
 
     def __init__(
         self,
-        paths: list[Path],
+        paths: list[Path | Page],
     ):
         QMainWindow.__init__(self)
 
@@ -61,9 +63,16 @@ class Tab(QMainWindow):
         self.stack = Stack(paths, conf.show_inactive_plots)
         self.load_stack.connect(self.stack.process)
         self.stack.set_canvas.connect(self.set_canvas)
+        self.stack.add_layer.connect(self.canvas.add_thumbnail)
+        self.stack.add_layer.connect(self.splitview._add_plot)
+        self.stack.finished_loading.connect(self._finish_loading)
         self.stack.abort.connect(self._abort)
         self.stack.moveToThread(self.worker)
 
+        # Scheduler for recomputing the profiles
+        # ==================================================
+        self.scheduler = Scheduler(self.stack, parent=self)
+
         # Status bar
         # ==================================================
         self.status_bar = self.statusBar()
@@ -90,8 +99,17 @@ class Tab(QMainWindow):
         self.dock.sig_set_layer_contour_colour.connect(
             self.canvas._set_slice_contour_colour
         )
-        self.dock.sig_set_radial_segments.connect(self.stack._compute_radial_profile)
-        self.dock.sig_set_phase_segments.connect(self.stack._compute_phase_profile)
+        self.dock.sig_show_stack.connect(self.canvas._show_stack)
+        self.dock.sig_set_projection_mode.connect(self.canvas._show_stack)
+        self.dock.sig_set_inactive_layer_colour.connect(
+            self.canvas._set_inactive_layer_colour
+        )
+        self.dock.sig_set_radial_segments.connect(self.scheduler.set_radial_segments)
+        self.dock.sig_set_phase_segments.connect(self.scheduler.set_phase_segments)
+        self.dock.sig_set_cine_rate.connect(self.canvas.set_cine_rate)
+        self.stack.update_profile.connect(self.splitview._update_plot)
+        self.scheduler.progress.connect(self._update_recompute_progress)
+        self.scheduler.finished.connect(self._plot_profiles)
 
         # Load the tab
         # ==================================================
@@ -105,6 +123,24 @@ class Tab(QMainWindow):
         self.status_bar.showMessage(f"Processing {path}")
         self.progress_bar.setValue(self.progress_bar.value() + 1)
 
+    @Slot(int, int)
+    def _update_recompute_progress(
+        self,
+        done: int,
+        total: int,
+    ):
+        self.status_bar.showMessage(f"Updating profiles ({done}/{total})...")
+        self.progress_bar.setMaximum(total)
+        self.progress_bar.setValue(done)
+        self.progress_bar.show()
+
+    @Slot()
+    def _plot_profiles(self):
+        self.progress_bar.setValue(0)
+        self.progress_bar.hide()
+        self.status_bar.clearMessage()
+        self.splitview.plot(self.stack.layers, self.stack.active_layer)
+
     def setup_toolbar(self):
 
         # Dock widget toggle
@@ -136,13 +172,13 @@ class Tab(QMainWindow):
         # act_plot.triggered.connect(lambda: self.splitview.plot(self.stack.current_layer))
         # self.toolbar.addAction(act_plot)
 
-        # Profile statistics
+        # Profile export
         act_profile_stats = QAction(
             QIcon.fromTheme("edit-select-all"),
-            "Export profile statistics",
+            "Export profiles",
             self.toolbar,
         )
-        act_profile_stats.triggered.connect(lambda: self.stack._export_profile_statistics())
+        act_profile_stats.triggered.connect(lambda: self.stack._export_profiles())
         self.toolbar.addAction(act_profile_stats)
 
     @Slot()
@@ -161,20 +197,52 @@ class Tab(QMainWindow):
         self.stack._update_threshold(self.dock.show_inactive_plots)
 
     def _load_tab(self):
-        self.status_bar.showMessage(f"Loading stack from {self.paths[0].parent}...")
+        source = self.paths[0]
+        if isinstance(source, Page):
+            source = source.path
+        else:
+            source = source.parent
+        self.status_bar.showMessage(f"Loading stack from {source}...")
+        self.progress_bar.setMaximum(len(self.stack.paths))
         self.progress_bar.show()
         self.load_stack.emit()
 
     def _abort(self):
         self.worker.quit()
 
+    def closeEvent(self, event):
+        # Stop loading the layers that are still pending
+        # and prefetching the renders of the layers
+        self.stack.cancel()
+        self.canvas.close()
+
+        # The layers being analysed are waited for
+        # before the workers of the stack are released
+        self.worker.quit()
+        self.worker.wait()
+        self.stack.close()
+        super().closeEvent(event)
+
     @Slot()
     def set_canvas(self):
 
+        # The remaining layers are still being loaded,
+        # so the progress bar stays visible.
         self.status_bar.showMessage(f"Setting up canvas...")
+        self.canvas.set_stack(self.stack, auto_range=True)
+        self.setup_toolbar()
+
+    @Slot()
+    def _finish_loading(self):
+
         self.progress_bar.setValue(0)
         self.progress_bar.hide()
-        self.worker.quit()
-        self.canvas.set_stack(self.stack, auto_range=True)
         self.status_bar.clearMessage()
-        self.setup_toolbar()
+        self.worker.quit()
+
+        if self.stack.profile is not None:
+            self.status_bar.showMessage(f"Stage times: {self.stack.profile.summary()}")
+
+        # The projection of the stack is only available now
+        if conf.show_stack:
+            self.canvas.draw()
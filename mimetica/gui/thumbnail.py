@@ -1,3 +1,4 @@
+from PySide6.QtCore import Qt
 from PySide6.QtCore import QEvent
 from PySide6.QtCore import Signal
 
@@ -8,6 +9,7 @@ from PySide6.QtWidgets import QWidget
 from PySide6.QtWidgets import QLabel
 
 from mimetica import Layer
+from mimetica.scan import thumbnails
 
 
 class Thumbnail(QLabel):
@@ -27,11 +29,25 @@ class Thumbnail(QLabel):
         self.index = index
         self.layer = layer
 
-        (height, width) = layer.image.shape
+        (height, width) = layer.shape
         self.border_size = border_size
 
-        qimg = QImage(layer.path)
-        pxm = QPixmap(qimg).scaledToHeight(scale - 2 * self.border_size)
+        # The thumbnail is made by the worker that loaded the layer,
+        # so the image does not need to be decoded again here.
+        image = layer.thumbnail
+        if image is None:
+            image = thumbnails.from_mask(layer.mask)
+        qimg = QImage(
+            image.data,
+            image.shape[1],
+            image.shape[0],
+            image.strides[0],
+            QImage.Format.Format_Grayscale8,
+        ).copy()
+        pxm = QPixmap(qimg).scaledToHeight(
+            scale - 2 * self.border_size,
+            Qt.TransformationMode.SmoothTransformation,
+        )
         self.setPixmap(pxm)
         self.setFixedHeight(scale)
         self.setStyleSheet(f"border: {self.border_size}px solid #000000;")
@@ -0,0 +1,540 @@
+from concurrent.futures import FIRST_COMPLETED
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import wait
+from pathlib import Path
+
+import io
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from mimetica import logger
+from mimetica.scan import export
+from mimetica.scan import pipeline
+from mimetica.scan import sampling
+from mimetica.scan.cache import write_atomic
+from mimetica.scan.layer import Layer
+from mimetica.scan.statistics import ProfileStatistics
+from mimetica.scan.volume import Page
+from mimetica.utils import profiling
+
+
+# Bump this whenever the layout of the manifest or the checkpoints changes
+MANIFEST_VERSION = 2
+
+
+def _identity(source: Path | Page) -> str:
+    """
+    Identify the image of a layer by its path, page, size and
+    modification time, so that a checkpoint can be matched to it.
+
+    Args:
+        source: Path to the image file or a page of a multi-page volume.
+
+    Returns:
+        The identity.
+    """
+    (path, page) = source if isinstance(source, Page) else (source, None)
+    path = Path(path).resolve().absolute()
+    stat = path.stat()
+    return f"{path}|{page}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+class StackJob:
+    """
+    The analysis of a single stack within a batch.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        name: str,
+        checkpoint: Path,
+        writer: export.ProfileWriter | None = None,
+    ):
+        """
+        Create a job.
+
+        Args:
+            path: The stack (a directory of images or a multi-page volume).
+            name: Name of the output directory of the stack.
+            checkpoint: Directory holding the layers completed so far.
+            writer: Streaming writer for the profiles. If given, the profiles
+                of each layer are written as soon as the layer is completed
+                and the layer is not kept.
+        """
+        self.path = path
+        self.name = name
+        self.checkpoint = checkpoint
+        self.writer = writer
+
+        self.sources: list[Path | Page] = []
+        self.layers: dict[int, Layer] = {}
+        self.failed: dict[int, str] = {}
+        self.statistics = ProfileStatistics()
+        self.completed = 0
+        self.queue: list[int] = []
+        self.resumed = 0
+        self.memory = 0
+        self.start = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.completed + len(self.failed) == len(self.sources)
+
+    def _layer_file(
+        self,
+        index: int,
+    ) -> Path:
+        return self.checkpoint / f"{index:06d}.npz"
+
+    def prepare(
+        self,
+        radial_samples: int,
+        phase_samples: int,
+    ):
+        """
+        Find the images of the stack and restore the layers
+        that were completed by a previous run.
+
+        Args:
+            radial_samples: Number of radial samples.
+            phase_samples: Number of phase samples.
+        """
+        self.sources = pipeline.find_images(self.path)
+        self.checkpoint.mkdir(parents=True, exist_ok=True)
+
+        for index, source in enumerate(self.sources):
+            (path, page) = source if isinstance(source, Page) else (source, None)
+            layer_file = self._layer_file(index)
+            if not layer_file.exists():
+                self.queue.append(index)
+                continue
+
+            with np.load(layer_file) as data:
+                record = {name: data[name] for name in data.files}
+
+            # Slices may have been added, removed or modified since
+            # the checkpoint was saved, in which case it belongs to
+            # another image (or an older version of it).
+            try:
+                identity = _identity(source)
+            except OSError:
+                identity = None
+            if "source" not in record or str(record["source"]) != identity:
+                logger.warning(
+                    f"Discarding the checkpoint of layer {index} of '{self.path}' "
+                    f"(the image has changed)"
+                )
+                layer_file.unlink()
+                self.queue.append(index)
+                continue
+
+            layer = Layer.from_record(path, record, page)
+            layer.compute_radial_profile(radial_samples)
+            layer.compute_phase_profile(phase_samples)
+            self._add(index, layer)
+
+        # Layers of slices that have been removed from the stack
+        for layer_file in self.checkpoint.glob("*.npz"):
+            if int(layer_file.stem) >= len(self.sources):
+                layer_file.unlink()
+
+        self.resumed = self.completed
+        # Unreadable images only fail when they are analysed,
+        # so the estimate is taken from the first readable one.
+        for index in self.queue:
+            try:
+                self.memory = pipeline.estimate_memory(self.sources[index])
+                break
+            except Exception:
+                continue
+        self.start = time.perf_counter()
+
+    def complete(
+        self,
+        index: int,
+        layer: Layer,
+    ):
+        """
+        Record a completed layer and save it to the checkpoint.
+
+        Args:
+            index: Index of the layer.
+            layer: The layer.
+        """
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            source=np.array(_identity(self.sources[index])),
+            **layer.to_record(),
+        )
+        write_atomic(self._layer_file(index), buffer.getvalue())
+        self._add(index, layer)
+
+    def _add(
+        self,
+        index: int,
+        layer: Layer,
+    ):
+        if self.writer is None:
+            self.layers[index] = layer
+        else:
+            self.writer.write(index, layer)
+        self.statistics.add(layer)
+        self.completed += 1
+
+    def fail(
+        self,
+        index: int,
+        error: Exception,
+    ):
+        """
+        Record a layer that could not be analysed.
+
+        The other layers of the stack are still analysed and checkpointed,
+        but the stack is not exported.
+
+        Args:
+            index: Index of the layer.
+            error: The error raised by the analysis.
+        """
+        self.failed[index] = f"{self.sources[index]}: {error}"
+        logger.error(f"Failed to analyse layer {index} of '{self.path}': {error}")
+
+
+class BatchScheduler:
+    """
+    Analyses many stacks with a shared pool of worker processes.
+
+    Several stacks are analysed concurrently, and layers are submitted to
+    the workers as long as the estimated memory needed to analyse the
+    layers in flight stays within the budget.
+
+    Progress is checkpointed to the output directory: every completed
+    layer is saved (without its mask) under `.checkpoint/<stack>`, and
+    the state of every stack is recorded in `manifest.json`. Running the
+    same batch again skips completed stacks and resumes interrupted ones
+    from their completed layers. Each saved layer records the path, size
+    and modification time of its image, and is analysed again if the image
+    has changed. The saved layers of completed stacks are kept, so the
+    number of samples can be changed between runs: the profiles are then
+    derived from the saved histograms and the stacks are exported again
+    without analysing the images.
+
+    A layer that cannot be analysed (e.g., an unreadable image) does not
+    stop the batch. Its stack is marked as failed in the manifest, with
+    the layers that failed, and is not exported. The layers that were
+    completed are kept, so only the failed layers are analysed again
+    when the batch is resumed.
+
+    If a streaming format is given, the profiles of each layer are written
+    to the output as soon as the layer is completed and the layers are not
+    kept, so memory use does not grow with the size of the stacks. In that
+    case, only the per-layer profiles and their statistics are written.
+    """
+
+    def __init__(
+        self,
+        stacks: list[Path],
+        output: Path,
+        radial_samples: int = sampling.RADIAL_SAMPLES,
+        phase_samples: int = sampling.PHASE_SAMPLES,
+        workers: int | None = None,
+        max_stacks: int = 2,
+        memory_budget: int = 4096 * 2**20,
+        use_cache: bool = True,
+        restart: bool = False,
+        stream: str | None = None,
+        profile: bool = False,
+    ):
+        """
+        Create a scheduler.
+
+        Args:
+            stacks: The stacks to analyse.
+            output: The output directory (one subdirectory per stack).
+            radial_samples: Number of radial samples.
+            phase_samples: Number of phase samples.
+            workers: Number of worker processes (defaults to the number of CPUs).
+            max_stacks: Maximal number of stacks analysed concurrently.
+            memory_budget: Maximal estimated memory (in bytes) of the layers in flight.
+            use_cache: Use the result cache.
+            restart: Ignore the progress recorded by a previous run.
+            stream: Streaming format for the profiles ("csv", "npz" or "parquet").
+            profile: Profile the stages of the analysis in the workers.
+        """
+        self.output = Path(output)
+        self.radial_samples = radial_samples
+        self.phase_samples = phase_samples
+        self.workers = workers
+        self.max_stacks = max_stacks
+        self.memory_budget = memory_budget
+        self.use_cache = use_cache
+        self.stream = stream
+        self.profile = profiling.Profile() if profile else None
+
+        self.manifest_path = self.output / "manifest.json"
+        self.checkpoints = self.output / ".checkpoint"
+
+        if restart:
+            self.manifest_path.unlink(missing_ok=True)
+            shutil.rmtree(self.checkpoints, ignore_errors=True)
+
+        self.output.mkdir(parents=True, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+        # Register the stacks, keeping the names from previous runs
+        # ==================================================
+        names = {entry["name"] for entry in self.manifest["stacks"].values()}
+        self.jobs: list[StackJob] = []
+        keys = dict.fromkeys(str(Path(stack).resolve().absolute()) for stack in stacks)
+        for key in keys:
+            entry = self.manifest["stacks"].get(key)
+            if entry is None:
+                name = Path(key).stem
+                suffix = 1
+                while name in names:
+                    suffix += 1
+                    name = f"{Path(key).stem}-{suffix}"
+                names.add(name)
+                entry = {"name": name, "status": "pending"}
+                self.manifest["stacks"][key] = entry
+
+            if entry["status"] == "done":
+                logger.info(f"Skipping '{key}' (already analysed)")
+                continue
+
+            self.jobs.append(
+                StackJob(Path(key), entry["name"], self.checkpoints / entry["name"])
+            )
+
+        self._save_manifest()
+
+    def _load_manifest(self) -> dict:
+        """
+        Load the manifest of a previous run or create a new one.
+
+        Returns:
+            The manifest.
+        """
+        if self.manifest_path.exists():
+            manifest = json.loads(self.manifest_path.read_text())
+            if manifest.get("version") == MANIFEST_VERSION:
+                settings = {
+                    "radial_samples": self.radial_samples,
+                    "phase_samples": self.phase_samples,
+                    "stream": self.stream,
+                }
+                if manifest["settings"] != settings:
+                    # Completed stacks are exported again from their saved layers
+                    logger.info("The settings have changed, re-exporting all stacks")
+                    manifest["settings"] = settings
+                    for entry in manifest["stacks"].values():
+                        entry["status"] = "pending"
+                return manifest
+
+        return {
+            "version": MANIFEST_VERSION,
+            "settings": {
+                "radial_samples": self.radial_samples,
+                "phase_samples": self.phase_samples,
+                "stream": self.stream,
+            },
+            "stacks": {},
+        }
+
+    def _save_manifest(self):
+        write_atomic(
+            self.manifest_path,
+            json.dumps(self.manifest, indent=2).encode(),
+        )
+
+    def run(self) -> dict[str, dict]:
+        """
+        Analyse all the stacks.
+
+        Returns:
+            The manifest entries of the stacks, including their throughput.
+        """
+        pending = list(self.jobs)
+        active: list[StackJob] = []
+        futures: dict[Future, tuple[StackJob, int]] = {}
+        in_flight = 0
+
+        workers = self.workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            while len(pending) > 0 or len(active) > 0:
+
+                # Start new stacks
+                # ==================================================
+                while len(pending) > 0 and len(active) < self.max_stacks:
+                    job = pending.pop(0)
+                    try:
+                        # The writer is only opened once the stack is started,
+                        # since opening it discards the output of a previous run.
+                        if self.stream is not None:
+                            job.writer = export.open_writer(self.output / job.name, self.stream)
+                        job.prepare(self.radial_samples, self.phase_samples)
+                    except Exception as e:
+                        if job.writer is not None:
+                            job.writer.close()
+                        logger.error(f"Failed to prepare '{job.path}': {e}")
+                        self.manifest["stacks"][str(job.path)].update(
+                            {
+                                "status": "failed",
+                                "error": str(e),
+                                "slices": 0,
+                                "analysed": 0,
+                                "elapsed": 0.0,
+                                "throughput": 0.0,
+                            }
+                        )
+                        self._save_manifest()
+                        continue
+                    self.manifest["stacks"][str(job.path)]["status"] = "running"
+                    self._save_manifest()
+                    if job.resumed > 0:
+                        logger.info(
+                            f"Resuming '{job.path}' ({job.resumed}/{len(job.sources)} layers done)"
+                        )
+                    active.append(job)
+
+                # Submit layers from the active stacks in turn while
+                # there are idle workers and the budget allows it.
+                # One layer is always allowed so that a single layer
+                # larger than the budget does not stall the batch.
+                # ==================================================
+                submitted = True
+                while submitted and len(futures) < 2 * workers:
+                    submitted = False
+                    for job in active:
+                        if len(job.queue) == 0 or len(futures) >= 2 * workers:
+                            continue
+                        if len(futures) > 0 and in_flight + job.memory > self.memory_budget:
+                            continue
+
+                        index = job.queue.pop(0)
+                        future = executor.submit(
+                            profiling.call,
+                            self.profile is not None,
+                            pipeline.analyse_layer,
+                            job.sources[index],
+                            self.radial_samples,
+                            self.phase_samples,
+                            self.use_cache,
+                        )
+                        futures[future] = (job, index)
+                        in_flight += job.memory
+                        submitted = True
+
+                # Collect the completed layers and finish the completed stacks
+                # ==================================================
+                if len(futures) > 0:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        (job, index) = futures.pop(future)
+                        in_flight -= job.memory
+                        try:
+                            (layer, profile) = future.result()
+                        except Exception as e:
+                            job.fail(index, e)
+                            continue
+                        if profile is not None:
+                            self.profile.merge(profile)
+                        job.complete(index, layer)
+
+                for job in [job for job in active if job.finished]:
+                    active.remove(job)
+                    self._finish(job)
+
+        if self.profile is not None:
+            self.profile.log()
+            self.profile.write_trace(self.output / "trace.json")
+            logger.info(f"Trace written to '{self.output / 'trace.json'}'")
+
+        return {str(job.path): self.manifest["stacks"][str(job.path)] for job in self.jobs}
+
+    def _fail(
+        self,
+        job: StackJob,
+    ):
+        """
+        Record a stack with layers that could not be analysed.
+        The checkpoint is kept so that the batch can be resumed.
+
+        Args:
+            job: The job.
+        """
+        if job.writer is not None:
+            job.writer.close()
+
+        entry = self.manifest["stacks"][str(job.path)]
+        elapsed = time.perf_counter() - job.start
+        analysed = job.completed - job.resumed
+        entry.update(
+            {
+                "status": "failed",
+                "slices": len(job.sources),
+                "analysed": analysed,
+                "elapsed": elapsed,
+                "throughput": analysed / elapsed if elapsed > 0 else 0.0,
+                "failed": {str(index): error for (index, error) in sorted(job.failed.items())},
+            }
+        )
+        self._save_manifest()
+
+        logger.error(
+            f"{len(job.failed)}/{len(job.sources)} layers of '{job.path}' could not be "
+            f"analysed, the stack was not exported"
+        )
+
+    def _finish(
+        self,
+        job: StackJob,
+    ):
+        """
+        Export the results of a completed stack and record its throughput.
+
+        Args:
+            job: The job.
+        """
+        if len(job.failed) > 0:
+            self._fail(job)
+            return
+
+        entry = self.manifest["stacks"][str(job.path)]
+        entry.pop("failed", None)
+        entry.pop("error", None)
+
+        if len(job.sources) == 0:
+            logger.warning(f"No images found in '{job.path}'")
+        elif job.writer is not None:
+            job.writer.close()
+            pipeline.write_statistics(job.statistics, self.output / job.name / "statistics.xlsx")
+        else:
+            layers = [job.layers[index] for index in range(len(job.sources))]
+            pipeline.export_stack(layers, self.output / job.name, job.statistics)
+
+        elapsed = time.perf_counter() - job.start
+        analysed = len(job.sources) - job.resumed
+        entry.update(
+            {
+                "status": "done",
+                "slices": len(job.sources),
+                "analysed": analysed,
+                "elapsed": elapsed,
+                "throughput": analysed / elapsed if elapsed > 0 else 0.0,
+            }
+        )
+        self._save_manifest()
+
+        logger.info(
+            f"Analysed {analysed} layers from '{job.path}' in {elapsed:.2f} s "
+            f"({entry['throughput']:.1f} slices/s), "
+            f"results written to '{self.output / job.name}'"
+        )
@@ -0,0 +1,319 @@
+from pathlib import Path
+
+import hashlib
+import io
+import os
+import tempfile
+
+import numpy as np
+import platformdirs
+
+from mimetica.scan import sampling
+from mimetica.scan import thumbnails
+
+
+# Bump this whenever the way layers are loaded or analysed changes
+# in a way that is not captured by the settings below.
+CACHE_VERSION = 1
+
+
+def write_atomic(
+    path: Path,
+    data: bytes,
+):
+    """
+    Write a file atomically so that concurrent readers
+    never see a partially written file.
+
+    Args:
+        path: The destination.
+        data: The content.
+    """
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as file:
+        file.write(data)
+    os.replace(tmp, path)
+
+
+class ResultCache:
+    """
+    A persistent, content-addressed cache of layer analysis results.
+
+    Each entry holds the centre, the radius, the histograms from which the
+    profiles are derived and the packed mask of a single image. Entries are
+    keyed by the hash of the content of the image and the analysis settings,
+    so they remain valid if a file is moved or copied, and the number of
+    radial or phase samples can be changed without invalidating them.
+
+    To avoid reading an unchanged file again, the content hash is itself
+    cached under the path, size and modification time of the file.
+
+    The thumbnails of the images are kept alongside the results under the
+    same content hash, since they do not depend on the analysis settings.
+
+    The cache is capped in size and the least recently used entries are
+    evicted first. Using an entry updates its modification time,
+    which serves as the last access time.
+    """
+
+    def __init__(
+        self,
+        root: Path | None = None,
+    ):
+        """
+        Create or open a cache.
+
+        Args:
+            root: The cache directory (defaults to the user cache directory).
+        """
+        if root is None:
+            root = Path(platformdirs.user_cache_dir("mimetica", "Mimetica")) / "layers"
+
+        self.root = Path(root)
+        self.ids = self.root / "ids"
+        self.entries = self.root / "entries"
+        self.thumbnails = self.root / "thumbnails"
+
+        self.ids.mkdir(parents=True, exist_ok=True)
+        self.entries.mkdir(parents=True, exist_ok=True)
+        self.thumbnails.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def settings() -> str:
+        """
+        A signature of the settings that affect the cached results.
+
+        Returns:
+            The signature as a string.
+        """
+        return "|".join(
+            str(setting)
+            for setting in (
+                CACHE_VERSION,
+                sampling.RING_OFFSET,
+                sampling.RADIUS_QUANTUM,
+                sampling.PHASE_RESOLUTION,
+            )
+        )
+
+    def content_hash(
+        self,
+        path: Path,
+    ) -> str:
+        """
+        Compute (or look up) the hash of the content of a file.
+
+        Args:
+            path: Path to the file.
+
+        Returns:
+            The hash as a hex string.
+        """
+        path = Path(path).resolve().absolute()
+        stat = path.stat()
+        identity = hashlib.blake2b(
+            f"{path}|{stat.st_size}|{stat.st_mtime_ns}".encode(),
+            digest_size=16,
+        ).hexdigest()
+
+        id_file = self.ids / identity
+        if id_file.exists():
+            os.utime(id_file)
+            return id_file.read_text()
+
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, "rb") as file:
+            while chunk := file.read(2**20):
+                digest.update(chunk)
+
+        content = digest.hexdigest()
+        write_atomic(id_file, content.encode())
+        return content
+
+    def _entry(
+        self,
+        path: Path,
+        page: int | None = None,
+    ) -> Path:
+        """
+        The location of the entry for a file.
+
+        Args:
+            path: Path to the file.
+            page: Index of the page if the file is a multi-page volume.
+
+        Returns:
+            The path to the entry.
+        """
+        content = self.content_hash(path)
+        if page is not None:
+            content = f"{content}|{page}"
+
+        key = hashlib.blake2b(
+            f"{content}|{self.settings()}".encode(),
+            digest_size=20,
+        ).hexdigest()
+        return self.entries / f"{key}.npz"
+
+    def get(
+        self,
+        path: Path,
+        page: int | None = None,
+    ) -> dict[str, np.ndarray] | None:
+        """
+        Retrieve the results for a file.
+
+        Args:
+            path: Path to the file.
+            page: Index of the page if the file is a multi-page volume.
+
+        Returns:
+            The cached results or None if there is no valid entry.
+        """
+        entry = self._entry(path, page)
+        if not entry.exists():
+            return None
+
+        try:
+            with np.load(entry) as data:
+                record = {name: data[name] for name in data.files}
+            os.utime(entry)
+        except Exception:
+            # Corrupt or concurrently evicted entry
+            entry.unlink(missing_ok=True)
+            return None
+
+        return record
+
+    def put(
+        self,
+        path: Path,
+        record: dict[str, np.ndarray],
+        page: int | None = None,
+    ):
+        """
+        Store the results for a file.
+
+        Args:
+            path: Path to the file.
+            record: The results.
+            page: Index of the page if the file is a multi-page volume.
+        """
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **record)
+        write_atomic(self._entry(path, page), buffer.getvalue())
+
+    def _thumbnail(
+        self,
+        path: Path,
+        page: int | None = None,
+    ) -> Path:
+        """
+        The location of the thumbnail of a file.
+
+        Args:
+            path: Path to the file.
+            page: Index of the page if the file is a multi-page volume.
+
+        Returns:
+            The path to the thumbnail.
+        """
+        content = self.content_hash(path)
+        if page is not None:
+            content = f"{content}|{page}"
+
+        key = hashlib.blake2b(
+            f"{content}|{CACHE_VERSION}|{thumbnails.THUMBNAIL_HEIGHT}".encode(),
+            digest_size=20,
+        ).hexdigest()
+        return self.thumbnails / f"{key}.npy"
+
+    def get_thumbnail(
+        self,
+        path: Path,
+        page: int | None = None,
+    ) -> np.ndarray | None:
+        """
+        Retrieve the thumbnail of a file.
+
+        Args:
+            path: Path to the file.
+            page: Index of the page if the file is a multi-page volume.
+
+        Returns:
+            The thumbnail or None if it is not cached.
+        """
+        entry = self._thumbnail(path, page)
+        if not entry.exists():
+            return None
+
+        try:
+            thumbnail = np.load(entry)
+            os.utime(entry)
+        except Exception:
+            # Corrupt or concurrently evicted entry
+            entry.unlink(missing_ok=True)
+            return None
+
+        return thumbnail
+
+    def put_thumbnail(
+        self,
+        path: Path,
+        thumbnail: np.ndarray,
+        page: int | None = None,
+    ):
+        """
+        Store the thumbnail of a file.
+
+        Args:
+            path: Path to the file.
+            thumbnail: The thumbnail.
+            page: Index of the page if the file is a multi-page volume.
+        """
+        buffer = io.BytesIO()
+        np.save(buffer, thumbnail)
+        write_atomic(self._thumbnail(path, page), buffer.getvalue())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            file.stat().st_size
+            for directory in (self.ids, self.entries, self.thumbnails)
+            for file in directory.iterdir()
+        )
+
+    def prune(
+        self,
+        max_bytes: int,
+    ) -> tuple[int, int]:
+        """
+        Evict the least recently used files until the cache
+        is no larger than the given size.
+
+        Args:
+            max_bytes: The maximal size of the cache.
+
+        Returns:
+            The number of evicted files and the number of freed bytes.
+        """
+        files = []
+        for directory in (self.ids, self.entries, self.thumbnails):
+            for file in directory.iterdir():
+                try:
+                    files.append((file.stat(), file))
+                except FileNotFoundError:
+                    continue
+
+        total = sum(stat.st_size for (stat, _) in files)
+        evicted = 0
+        freed = 0
+
+        for stat, file in sorted(files, key=lambda item: item[0].st_mtime):
+            if total - freed <= max_bytes:
+                break
+            file.unlink(missing_ok=True)
+            evicted += 1
+            freed += stat.st_size
+
+        return evicted, freed
@@ -0,0 +1,317 @@
+from abc import ABC
+from abc import abstractmethod
+from pathlib import Path
+
+import io
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+from mimetica.scan import pipeline
+from mimetica.scan.cache import write_atomic
+from mimetica.scan.layer import Layer
+
+
+class ProfileWriter(ABC):
+    """
+    Writes the radial and phase profiles of the layers of a stack
+    as the layers are analysed, with one row per layer.
+
+    Layers are buffered and written in chunks, so the memory used by the
+    writer does not depend on the number of layers. Layers can be written
+    in any order, and each row starts with the index of the layer
+    in the stack and its name.
+    """
+
+    # Suffix of the files written by the writer
+    suffix = ""
+
+    def __init__(
+        self,
+        path: Path,
+        chunk_size: int = 64,
+    ):
+        """
+        Create a writer.
+
+        Args:
+            path: Path to the output. The radial and phase profiles are
+                written to separate files, with `_radial` and `_phase`
+                appended to the name of the file.
+            chunk_size: Number of layers written at once.
+        """
+        self.path = Path(path)
+        self.chunk_size = chunk_size
+        self.rows = 0
+        self._buffer: list[tuple[int, Layer]] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def profile_path(
+        self,
+        profile: str,
+    ) -> Path:
+        """
+        The file holding one of the profiles.
+
+        Args:
+            profile: The profile ("radial" or "phase").
+
+        Returns:
+            The path to the file.
+        """
+        return self.path.with_name(f"{self.path.stem}_{profile}{self.suffix}")
+
+    def write(
+        self,
+        index: int,
+        layer: Layer,
+    ):
+        """
+        Add a layer to the output.
+
+        Args:
+            index: Index of the layer in the stack.
+            layer: The layer, with its profiles computed.
+        """
+        self._buffer.append((index, layer))
+        if len(self._buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered layers.
+        """
+        if len(self._buffer) == 0:
+            return
+
+        indices = np.array([index for (index, _) in self._buffer])
+        names = [pipeline.layer_name(layer) for (_, layer) in self._buffer]
+        for profile in ("radial", "phase"):
+            positions = getattr(self._buffer[0][1], f"{profile}_range")
+            rows = np.vstack([getattr(layer, f"{profile}_profile") for (_, layer) in self._buffer])
+            self._write_chunk(profile, indices, names, positions, rows)
+
+        self.rows += len(self._buffer)
+        self._buffer.clear()
+
+    def close(self):
+        """
+        Write the remaining layers and close the files.
+        """
+        self.flush()
+
+    @abstractmethod
+    def _write_chunk(
+        self,
+        profile: str,
+        indices: np.ndarray,
+        names: list[str],
+        positions: np.ndarray,
+        rows: np.ndarray,
+    ):
+        """
+        Write a chunk of profiles.
+
+        Args:
+            profile: The profile ("radial" or "phase").
+            indices: Indices of the layers.
+            names: Names of the layers.
+            positions: Sample positions of the profile.
+            rows: The profiles, with one row per layer.
+        """
+
+    @staticmethod
+    def _frame(
+        indices: np.ndarray,
+        names: list[str],
+        positions: np.ndarray,
+        rows: np.ndarray,
+    ) -> pd.DataFrame:
+        frame = pd.DataFrame(rows, columns=[f"{position:g}" for position in positions])
+        frame.insert(0, "Layer", names)
+        frame.insert(0, "Index", indices)
+        return frame
+
+
+class CsvProfileWriter(ProfileWriter):
+    """
+    Appends the profiles to CSV files, with the
+    sample positions in the header.
+    """
+
+    suffix = ".csv"
+
+    def __init__(
+        self,
+        path: Path,
+        chunk_size: int = 64,
+    ):
+        super().__init__(path, chunk_size)
+        self._files = {}
+
+    def _write_chunk(
+        self,
+        profile: str,
+        indices: np.ndarray,
+        names: list[str],
+        positions: np.ndarray,
+        rows: np.ndarray,
+    ):
+        header = profile not in self._files
+        if header:
+            self._files[profile] = open(self.profile_path(profile), "w", newline="")
+
+        frame = self._frame(indices, names, positions, rows)
+        frame.to_csv(self._files[profile], header=header, index=False)
+        self._files[profile].flush()
+
+    def close(self):
+        super().close()
+        for file in self._files.values():
+            file.close()
+        self._files.clear()
+
+
+class NpzProfileWriter(ProfileWriter):
+    """
+    Writes each chunk of profiles to a separate NumPy archive (a shard),
+    numbered in the order in which they are written. Each shard holds the
+    indices and names of its layers (`indices` and `layers`), the sample
+    positions (`radial_range` and `phase_range`) and the profiles
+    (`radial_profiles` and `phase_profiles`).
+    """
+
+    suffix = ".npz"
+
+    def __init__(
+        self,
+        path: Path,
+        chunk_size: int = 64,
+    ):
+        super().__init__(path, chunk_size)
+        self.shards = 0
+        self._shard = {}
+
+        # Remove the shards of a previous export
+        for shard in self.path.parent.glob(f"{self.path.stem}_[0-9]*{self.suffix}"):
+            shard.unlink()
+
+    def shard_path(
+        self,
+        shard: int,
+    ) -> Path:
+        return self.path.with_name(f"{self.path.stem}_{shard:06d}{self.suffix}")
+
+    def _write_chunk(
+        self,
+        profile: str,
+        indices: np.ndarray,
+        names: list[str],
+        positions: np.ndarray,
+        rows: np.ndarray,
+    ):
+        self._shard.update(
+            {
+                "indices": indices,
+                "layers": np.array(names),
+                f"{profile}_range": positions,
+                f"{profile}_profiles": rows,
+            }
+        )
+        if "radial_profiles" not in self._shard or "phase_profiles" not in self._shard:
+            return
+
+        buffer = io.BytesIO()
+        np.savez(buffer, **self._shard)
+        write_atomic(self.shard_path(self.shards), buffer.getvalue())
+        self.shards += 1
+        self._shard.clear()
+
+
+class ParquetProfileWriter(ProfileWriter):
+    """
+    Appends the profiles to Parquet files, one row group per chunk.
+    Requires pyarrow.
+    """
+
+    suffix = ".parquet"
+
+    def __init__(
+        self,
+        path: Path,
+        chunk_size: int = 64,
+    ):
+        if pyarrow is None:
+            raise RuntimeError("Writing Parquet files requires pyarrow")
+
+        super().__init__(path, chunk_size)
+        self._writers = {}
+
+    def _write_chunk(
+        self,
+        profile: str,
+        indices: np.ndarray,
+        names: list[str],
+        positions: np.ndarray,
+        rows: np.ndarray,
+    ):
+        table = pyarrow.Table.from_pandas(
+            self._frame(indices, names, positions, rows),
+            preserve_index=False,
+        )
+        if profile not in self._writers:
+            self._writers[profile] = pyarrow.parquet.ParquetWriter(
+                self.profile_path(profile),
+                table.schema,
+            )
+        self._writers[profile].write_table(table)
+
+    def close(self):
+        super().close()
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+
+
+# Streaming writers by format
+WRITERS = {
+    "csv": CsvProfileWriter,
+    "npz": NpzProfileWriter,
+    "parquet": ParquetProfileWriter,
+}
+
+
+def open_writer(
+    directory: Path,
+    kind: str,
+    chunk_size: int = 64,
+) -> ProfileWriter:
+    """
+    Open a streaming writer for the profiles of a stack.
+
+    Args:
+        directory: The output directory.
+        kind: The format ("csv", "npz" or "parquet").
+        chunk_size: Number of layers written at once.
+
+    Returns:
+        The writer.
+    """
+    if kind not in WRITERS:
+        raise ValueError(f"Unsupported streaming format '{kind}'")
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    writer = WRITERS[kind]
+    return writer(directory / f"profiles{writer.suffix}", chunk_size)
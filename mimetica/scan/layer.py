@@ -1,49 +1,62 @@
 from pathlib import Path
 
-from PySide6.QtCore import Slot
-
 import skimage as ski
-import skimage.draw as skd
-
-import shapely as shp
 
 import numpy as np
 
-from mimetica import conf
 from mimetica import utils
+from mimetica.scan import sampling
+from mimetica.scan import thumbnails
+from mimetica.scan import volume
+from mimetica.scan.mask import Mask
+from mimetica.utils import profiling
 
 
 class Layer:
     def __init__(
         self,
         path: Path,
+        page: int | None = None,
+        thumbnail: bool = False,
     ):
+        """
+        Load and analyse a layer.
+
+        Args:
+            path: Path to the image file.
+            page: Index of the page if the file is a multi-page volume.
+            thumbnail: Also create a thumbnail of the image.
+        """
         self.path = Path(path).resolve().absolute()
-        self.image = np.fliplr(ski.io.imread(str(self.path), as_gray=True).T)
-        h, w = self.image.shape
+        self.page = page
+        with profiling.stage("decode"):
+            if page is None:
+                image = ski.io.imread(str(self.path), as_gray=True)
+            else:
+                image = volume.read_page(self.path, page)
+
+        # The thumbnail is made while the decoded image is at hand
+        self.thumbnail = None
+        if thumbnail:
+            with profiling.stage("thumbnail"):
+                self.thumbnail = thumbnails.downsample(image)
+        image = np.fliplr(image.T)
 
         # Image properties
         # ==================================================
         # Minimal bounding circle
-        self.mbc, self.mbr = utils.compute_minimal_bounding_circle(self.image)
-        mbc_x, mbc_y = self.mbc.boundary.coords.xy
+        with profiling.stage("mbc"):
+            self.centre, self.mbr = utils.compute_minimal_bounding_circle(image)
 
-        pad_lr = max(abs(min(0, min(mbc_x))), max(0, max(mbc_x) - w))
-        pad_tb = max(abs(min(0, min(mbc_y))), max(0, max(mbc_y) - h))
-        pad = int(max(pad_lr, pad_tb) + 1)
+        # Keep only a bit-packed mask of the material.
+        # The decoded image is discarded.
+        with profiling.stage("mask"):
+            self.mask = Mask(image)
+        self.shape = self.mask.shape
+        del image
 
-        # Pad the image to accommodate for the contour
-        # ==================================================
-        self.canvas = np.pad(
-            self.image,
-            pad,
-            mode="constant",
-            constant_values=0,
-        )
-
-        # Translate the minimal bounding circle to account for the padding
-        self.mbc = shp.affinity.translate(self.mbc, pad, pad)
-        self.centre = np.array(self.mbc.centroid.coords).flatten()
+        self.radial_histogram = np.empty([])
+        self.phase_histogram = np.empty([])
         self.radial_range = np.empty([])
         self.radial_profile = np.empty([])
         self.phase_range = np.empty([])
@@ -54,6 +67,89 @@ class Layer:
         # ==================================================
         self.process()
 
+    @classmethod
+    def from_record(
+        cls,
+        path: Path,
+        record: dict[str, np.ndarray],
+        page: int | None = None,
+    ) -> "Layer":
+        """
+        Restore a layer from the results of a previous analysis
+        without decoding the image.
+
+        Args:
+            path: Path to the image file.
+            record: The results created by `to_record` (with or without the mask).
+            page: Index of the page if the file is a multi-page volume.
+
+        Returns:
+            The layer.
+        """
+        layer = cls.__new__(cls)
+        layer.path = Path(path).resolve().absolute()
+        layer.page = page
+        layer.centre = record["centre"]
+        layer.mbr = float(record["mbr"])
+        layer.shape = tuple(int(s) for s in record["shape"])
+        layer.mask = None
+        layer.thumbnail = None
+        if "bits" in record:
+            layer.mask = Mask.from_bits(record["bits"], layer.shape)
+        layer.radial_histogram = record["radial_histogram"]
+        layer.phase_histogram = record["phase_histogram"]
+        layer.intersections = []
+        layer.compute_radial_profile()
+        layer.compute_phase_profile()
+        return layer
+
+    def to_record(self) -> dict[str, np.ndarray]:
+        """
+        Collect the results of the analysis that are needed
+        to restore this layer with `from_record`.
+        The mask is only included if the layer has one.
+
+        Returns:
+            The results as a dictionary of arrays.
+        """
+        record = {
+            "centre": self.centre,
+            "mbr": np.array(self.mbr),
+            "shape": np.array(self.shape),
+            "radial_histogram": self.radial_histogram,
+            "phase_histogram": self.phase_histogram,
+        }
+        if self.mask is not None:
+            record["bits"] = self.mask.bits
+        return record
+
+    @property
+    def image(self) -> np.ndarray:
+        """
+        The binarised image as a floating-point array.
+
+        Layers only store a bit-packed mask of the material, so the image
+        is created on demand and should not be kept around.
+
+        Returns:
+            The image with material pixels set to 1.
+        """
+        return self.mask.unpack().astype(np.float32)
+
+    @property
+    def canvas(self) -> np.ndarray:
+        """
+        The image as displayed on the canvas.
+
+        Rings and spokes that reach past the edge of the image are sampled
+        directly from the mask (pixels outside it are counted as empty),
+        so no padded copy is needed.
+
+        Returns:
+            The image.
+        """
+        return self.image
+
     def make_mask(self) -> np.ndarray:
         """
         Create a mask for this layer.
@@ -61,7 +157,7 @@ class Layer:
         Returns:
             A mask as a NumPy array.
         """
-        Y, X = np.meshgrid[: self.canvas.shape[0], : self.canvas.shape[1]]
+        Y, X = np.meshgrid[: self.shape[0], : self.shape[1]]
         mask = np.sqrt((X - self.centre[0]) ** 2 + (Y - self.centre[1]) ** 2)
         mask = np.exp(-3 * mask / mask.max())
         return mask
@@ -71,70 +167,124 @@ class Layer:
         Process this layer.
         For now, this is limited to computing the radial and phase profiles.
         """
+        self.compute_histograms()
         self.compute_radial_profile()
         self.compute_phase_profile()
 
-    @Slot()
-    def compute_radial_profile(self):
-        # Create an empty array
-        self.radial_profile = np.zeros((conf.radial_samples,))
-        self.radii = np.linspace(1.0, self.mbr, conf.radial_samples)
-        self.radial_range = np.linspace(0.0, 1.0, conf.radial_samples + 1)[1:]
-
-        for idx, radius in enumerate(self.radii):
-            # Create a virtual circle with the right radius.
-            # The 'andres' method does not leave gaps between
-            # consecutive rings if they are close enough.
-            rr, cc = skd.circle_perimeter(
-                int(self.centre[0]),
-                int(self.centre[1]),
-                int(radius),
-                method="andres",
+    def compute_histograms(self):
+        """
+        Count the material and the pixels in every ring and along
+        finely spaced spokes.
+
+        This is the only step that reads the mask. Profiles for any number
+        of samples are derived from these histograms without
+        accessing the image again.
+        """
+        with profiling.stage("ring_histogram"):
+            self.radial_histogram = np.vstack(
+                sampling.ring_histogram(self.mask, self.centre, self.mbr)
             )
-            # Find out how much material is sampled by the circle
-            # and compute the material fraction
-            circle = self.canvas[rr, cc]
-            material = np.count_nonzero(circle)
-            self.radial_profile[idx] = material / circle.size
-
-    @Slot()
-    def compute_phase_profile(self):
-        # Coordinates of the central point
-        (cx, cy) = self.centre
-
-        # Compute the angles from the pixel coordinates.
-        angles = conf.phase_samples
-
-        # X and Y datasets for the phase profile
-        self.phase_range = np.linspace(0.0, 360.0, angles, endpoint=False)
-        self.phase_profile = np.zeros_like(self.phase_range)
-
-        # Draw lines ('spokes') from the centre to the MBC, each rotated by
-        # an angle determined by the number of phase samples.
-        spokes = [
-            shp.affinity.rotate(
-                shp.LineString(
-                    [
-                        shp.Point(cx, cy),
-                        shp.Point(cx, cy + self.mbr),
-                    ],
-                ),
-                angle - 90,
-                origin=shp.Point(cx, cy),
+        with profiling.stage("spoke_histogram"):
+            self.phase_histogram = np.vstack(
+                sampling.spoke_histogram(
+                    self.mask,
+                    self.centre,
+                    self.mbr,
+                    sampling.PHASE_RESOLUTION,
+                )
             )
-            for angle in range(angles)
-        ]
-
-        for idx, spoke in enumerate(spokes):
-            # (end_x, end_y) = self.intersections[idx]
-            (cx, cy) = np.array(spoke.coords[0], dtype=np.int32)
-            (ex, ey) = np.array(spoke.coords[1], dtype=np.int32)
-
-            # Create a virtual line from the centre to the contour
-            rr, cc = np.array(skd.line(cx, cy, ex, ey))
-
-            # Find out how much material is sampled by the line
-            # and compute the material fraction
-            line = self.canvas[rr, cc]
-            material = np.count_nonzero(line)
-            self.phase_profile[idx] = material / line.size
+
+    def make_radial_profile(
+        self,
+        samples: int,
+    ) -> dict[str, np.ndarray]:
+        """
+        Derive the radial profile from the ring histogram
+        without modifying the layer.
+
+        Args:
+            samples: Number of radial samples.
+
+        Returns:
+            The radii, the normalised radial range and the radial profile.
+        """
+        radii = np.linspace(1.0, self.mbr, samples)
+
+        # Each sample takes the value of the ring that its radius falls into.
+        # Several samples can map onto the same ring if the number of
+        # samples exceeds the radius, in which case they share its value.
+        (material, pixels) = self.radial_histogram
+        rings = radii.astype(np.intp)
+
+        return {
+            "radii": radii,
+            "radial_range": np.linspace(0.0, 1.0, samples + 1)[1:],
+            "radial_profile": material[rings] / pixels[rings],
+        }
+
+    def make_phase_profile(
+        self,
+        samples: int,
+    ) -> dict[str, np.ndarray]:
+        """
+        Derive the phase profile from the spoke histogram
+        without modifying the layer.
+
+        Args:
+            samples: Number of phase samples.
+
+        Returns:
+            The phase range (in degrees) and the phase profile.
+        """
+        phase_range = np.linspace(0.0, 360.0, samples, endpoint=False)
+
+        # Each sample takes the value of the closest spoke in the histogram.
+        # This is exact if the number of samples divides PHASE_RESOLUTION.
+        (material, pixels) = self.phase_histogram
+        spokes = np.rint(phase_range * len(material) / 360.0).astype(np.intp)
+        spokes %= len(material)
+
+        return {
+            "phase_range": phase_range,
+            "phase_profile": material[spokes] / pixels[spokes],
+        }
+
+    def set_profiles(
+        self,
+        profiles: dict[str, np.ndarray],
+    ):
+        """
+        Replace the profiles of this layer.
+
+        Args:
+            profiles: Profiles created by `make_radial_profile`
+                and / or `make_phase_profile`.
+        """
+        for name, value in profiles.items():
+            setattr(self, name, value)
+
+    def compute_radial_profile(
+        self,
+        samples: int = sampling.RADIAL_SAMPLES,
+    ):
+        """
+        Compute the radial profile from the ring histogram.
+
+        Args:
+            samples: Number of radial samples.
+        """
+        with profiling.stage("radial_profile"):
+            self.set_profiles(self.make_radial_profile(samples))
+
+    def compute_phase_profile(
+        self,
+        samples: int = sampling.PHASE_SAMPLES,
+    ):
+        """
+        Compute the phase profile from the spoke histogram.
+
+        Args:
+            samples: Number of phase samples.
+        """
+        with profiling.stage("phase_profile"):
+            self.set_profiles(self.make_phase_profile(samples))
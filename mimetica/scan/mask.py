@@ -0,0 +1,179 @@
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+import os
+
+
+class Mask:
+    """
+    A compact, bit-packed representation of a binarised layer.
+
+    Each row of the material mask is packed into bytes with `np.packbits`,
+    so a layer occupies one bit per pixel. Pixels can be read directly from
+    the packed representation, either individually or as blocks of rows.
+
+    A mask created in a worker process can be moved into shared memory with
+    `share`, in which case pickling it only transfers the name of the
+    shared memory block. The receiving process maps the block directly
+    instead of copying the data. On Windows, masks are always pickled
+    by value (see `share`).
+    """
+
+    def __init__(
+        self,
+        image: np.ndarray,
+    ):
+        """
+        Pack an image into a mask.
+
+        Args:
+            image: The image to pack. Any non-zero pixel is considered material.
+        """
+        self.shape = image.shape
+        self.bits = np.packbits(image != 0, axis=1)
+
+        # Shared memory block holding the bits
+        # ==================================================
+        self._name = None
+        self._shm = None
+
+    @classmethod
+    def from_bits(
+        cls,
+        bits: np.ndarray,
+        shape: tuple[int, int],
+    ) -> "Mask":
+        """
+        Create a mask from bits packed previously.
+
+        Args:
+            bits: The packed bits.
+            shape: The shape of the unpacked mask.
+
+        Returns:
+            The mask.
+        """
+        mask = cls.__new__(cls)
+        mask.shape = tuple(int(s) for s in shape)
+        mask.bits = bits
+        mask._name = None
+        mask._shm = None
+        return mask
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def share(self):
+        """
+        Move the bits into a new shared memory block.
+
+        The mask can no longer be used in this process.
+        It should be pickled and sent to the process that will use it,
+        which takes over the ownership of the block and removes its name.
+        A block whose mask is never received stays allocated until the
+        resource tracker removes it when the program exits.
+
+        On Windows, a named block is destroyed as soon as its last handle
+        is closed, which may happen before the receiving process has mapped
+        it. The bits are therefore kept and pickled by value there.
+        """
+        if os.name == "nt":
+            return
+
+        shm = SharedMemory(create=True, size=max(1, self.bits.nbytes))
+        shared = np.ndarray(self.bits.shape, dtype=self.bits.dtype, buffer=shm.buf)
+        shared[:] = self.bits
+        del shared
+
+        self._name = shm.name
+        self._bits_shape = self.bits.shape
+        self.bits = None
+        shm.close()
+
+    def _attach(self):
+        """
+        Map the shared memory block created by `share` in another process.
+
+        The name of the block is removed immediately, so the memory is
+        released as soon as this mask is garbage-collected.
+        """
+        self._shm = SharedMemory(name=self._name)
+        self._shm.unlink()
+        self.bits = np.ndarray(self._bits_shape, dtype=np.uint8, buffer=self._shm.buf)
+        self._name = None
+
+    def __getstate__(self) -> dict:
+        # The shared memory handle cannot be pickled. A mask that is
+        # attached to a block is pickled by value, and one that has been
+        # shared only by the name of its block.
+        state = self.__dict__.copy()
+        state["_shm"] = None
+        if self._shm is not None:
+            state["bits"] = np.array(self.bits)
+        return state
+
+    def __setstate__(
+        self,
+        state: dict,
+    ):
+        self.__dict__.update(state)
+        if self.bits is None and self._name is not None:
+            self._attach()
+
+    def __del__(self):
+        # Release the view before closing the block
+        if self._shm is not None:
+            self.bits = None
+            self._shm.close()
+
+    def take(
+        self,
+        rr: np.ndarray,
+        cc: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Read individual pixels from the mask.
+
+        Args:
+            rr: Row coordinates of the pixels.
+            cc: Column coordinates of the pixels.
+
+        Returns:
+            A boolean array indicating which pixels contain material.
+        """
+        return ((self.bits[rr, cc >> 3] >> (7 - (cc & 7))) & 1).astype(bool)
+
+    def rows(
+        self,
+        start: int,
+        stop: int,
+        c_lo: int = 0,
+        c_hi: int | None = None,
+    ) -> np.ndarray:
+        """
+        Unpack a block of rows, optionally restricted to a range of columns.
+
+        Args:
+            start: First row of the block.
+            stop: Row after the last row of the block.
+            c_lo: First column of the block.
+            c_hi: Column after the last column of the block.
+
+        Returns:
+            The block as a boolean array.
+        """
+        if c_hi is None:
+            c_hi = self.shape[1]
+        block = np.unpackbits(self.bits[start:stop], axis=1, count=c_hi)
+        return block[:, c_lo:].view(bool)
+
+    def unpack(self) -> np.ndarray:
+        """
+        Unpack the entire mask.
+
+        Returns:
+            The mask as a boolean array.
+        """
+        return self.rows(0, self.shape[0])
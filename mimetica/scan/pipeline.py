@@ -0,0 +1,423 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from PIL import Image
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+from mimetica.scan import sampling
+from mimetica.scan import thumbnails
+from mimetica.scan import volume
+from mimetica.scan.cache import ResultCache
+from mimetica.scan.layer import Layer
+from mimetica.scan.statistics import ProfileStatistics
+from mimetica.scan.volume import Page
+from mimetica.utils import profiling
+
+
+# Approximate peak memory needed to analyse an image, per pixel.
+# Images are decoded to 64-bit floats, and the analysis makes
+# a few boolean copies of the image.
+BYTES_PER_PIXEL = 16
+
+# Image formats that can be opened as layers
+EXTENSIONS = {
+    ".bmp",
+    ".tif",
+    ".tiff",
+    ".png",
+    ".jpg",
+    ".jpeg",
+}
+
+
+def find_images(path: Path) -> list[Path | Page]:
+    """
+    Find the images making up a stack.
+
+    Args:
+        path: A single image, a multi-page volume or a directory of images.
+
+    Returns:
+        The sorted image paths, with multi-page volumes split into their pages.
+    """
+    path = Path(path)
+    if path.is_file():
+        return volume.expand([path])
+
+    paths = []
+    for file in path.iterdir():
+        if file.name.startswith("."):
+            continue
+
+        if file.suffix.lower() in EXTENSIONS:
+            paths.append(file.resolve().absolute())
+
+    return volume.expand(sorted(paths))
+
+
+def estimate_memory(source: Path | Page) -> int:
+    """
+    Estimate the peak memory needed to analyse an image
+    from its dimensions, without decoding it.
+
+    Args:
+        source: Path to the image file or a page of a multi-page volume.
+
+    Returns:
+        The estimate in bytes.
+    """
+    if isinstance(source, Page):
+        shape = volume.page_shape(*source)
+    else:
+        with Image.open(source) as image:
+            shape = image.size
+
+    return BYTES_PER_PIXEL * int(np.prod(shape[:2]))
+
+
+def make_layer(
+    source: Path | Page,
+    use_cache: bool = True,
+    thumbnail: bool = False,
+) -> Layer:
+    """
+    Create a layer for an image or a page of a volume.
+
+    If the result cache is enabled and holds the results for this image,
+    the layer is restored from it without decoding or analysing
+    the image. Otherwise, the layer is analysed and added to the cache.
+
+    Args:
+        source: Path to the image file or a page of a multi-page volume.
+        use_cache: Use the result cache.
+        thumbnail: Also create a thumbnail of the image (cached like the results).
+
+    Returns:
+        The layer.
+    """
+    (path, page) = source if isinstance(source, Page) else (source, None)
+
+    record = None
+    cached_thumbnail = None
+    if use_cache:
+        with profiling.stage("cache"):
+            cache = ResultCache()
+            record = cache.get(path, page)
+            if thumbnail:
+                cached_thumbnail = cache.get_thumbnail(path, page)
+
+    if record is not None:
+        layer = Layer.from_record(path, record, page)
+        if thumbnail:
+            # Without a cached thumbnail, the thumbnail is made
+            # from the mask rather than decoding the image again.
+            layer.thumbnail = cached_thumbnail
+            if layer.thumbnail is None and layer.mask is not None:
+                with profiling.stage("thumbnail"):
+                    layer.thumbnail = thumbnails.from_mask(layer.mask)
+        return layer
+
+    layer = Layer(path, page=page, thumbnail=thumbnail)
+    if use_cache:
+        with profiling.stage("cache"):
+            cache.put(path, layer.to_record(), page)
+            if layer.thumbnail is not None:
+                cache.put_thumbnail(path, layer.thumbnail, page)
+    return layer
+
+
+def analyse_layer(
+    source: Path | Page,
+    radial_samples: int = sampling.RADIAL_SAMPLES,
+    phase_samples: int = sampling.PHASE_SAMPLES,
+    use_cache: bool = True,
+) -> Layer:
+    """
+    Create a layer and compute its profiles, keeping only the results.
+
+    The mask of the layer is discarded, so the layer
+    is cheap to send back from a worker process.
+
+    Args:
+        source: Path to the image file or a page of a multi-page volume.
+        radial_samples: Number of radial samples.
+        phase_samples: Number of phase samples.
+        use_cache: Use the result cache.
+
+    Returns:
+        The layer without its mask.
+    """
+    layer = make_layer(source, use_cache)
+    layer.compute_radial_profile(radial_samples)
+    layer.compute_phase_profile(phase_samples)
+    layer.mask = None
+    return layer
+
+
+def layer_name(layer: Layer) -> str:
+    """
+    A name identifying a layer within its stack.
+
+    Args:
+        layer: The layer.
+
+    Returns:
+        The name of the file, followed by the page for volumes.
+    """
+    if layer.page is None:
+        return layer.path.name
+    return f"{layer.path.name} [page {layer.page}]"
+
+
+def write_statistics(
+    statistics: ProfileStatistics,
+    path: Path,
+):
+    """
+    Write the mean and standard deviation of the
+    radial and phase profiles to a spreadsheet.
+
+    Args:
+        statistics: The statistics of the profiles.
+        path: Path to the spreadsheet (.xlsx).
+    """
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+
+        radial_df = pd.DataFrame(
+            {
+                "Normalised radius [a.u.]": statistics.radial.positions,
+                "Radial mean": statistics.radial.mean,
+                "Radial SD": statistics.radial.sd,
+            }
+        )
+        radial_df.to_excel(writer, sheet_name="Radial profile stats", index=False)
+
+        phase_df = pd.DataFrame(
+            {
+                "Angle [deg]": statistics.phase.positions,
+                "Phase mean": statistics.phase.mean,
+                "Phase SD": statistics.phase.sd,
+            }
+        )
+        phase_df.to_excel(writer, sheet_name="Phase profile stats", index=False)
+
+
+def write_npz(
+    layers: list[Layer],
+    path: Path,
+    statistics: ProfileStatistics | None = None,
+):
+    """
+    Write the profiles of each layer and their statistics to a NumPy archive.
+
+    The archive holds the names of the layers (`layers`), the profiles
+    with one row per layer (`radial_profiles` and `phase_profiles`)
+    and the arrays of `ProfileStatistics.summary`, including the
+    sample positions (`radial_range` and `phase_range`).
+
+    Args:
+        layers: The layers.
+        path: Path to the archive (.npz).
+        statistics: The statistics of the profiles (computed from the layers if not given).
+    """
+    if statistics is None:
+        statistics = ProfileStatistics.from_layers(layers)
+
+    np.savez(
+        path,
+        layers=np.array([layer_name(layer) for layer in layers]),
+        radial_profiles=np.vstack([layer.radial_profile for layer in layers]),
+        phase_profiles=np.vstack([layer.phase_profile for layer in layers]),
+        **statistics.summary(),
+    )
+
+
+def profile_tables(
+    layers: list[Layer],
+    statistics: ProfileStatistics | None = None,
+) -> dict[str, pd.DataFrame]:
+    """
+    Arrange the profiles of each layer and their statistics in tables
+    with one row per sample and one column per layer.
+
+    Args:
+        layers: The layers.
+        statistics: The statistics of the profiles (computed from the layers if not given).
+
+    Returns:
+        The radial and phase tables.
+    """
+    if statistics is None:
+        statistics = ProfileStatistics.from_layers(layers)
+
+    names = [layer_name(layer) for layer in layers]
+
+    tables = {}
+    for profile, label in (
+        ("radial", "Normalised radius [a.u.]"),
+        ("phase", "Angle [deg]"),
+    ):
+        table = pd.DataFrame(
+            np.column_stack([getattr(layer, f"{profile}_profile") for layer in layers]),
+            columns=names,
+        )
+        table.insert(0, "SD", getattr(statistics, profile).sd)
+        table.insert(0, "Mean", getattr(statistics, profile).mean)
+        table.insert(0, label, getattr(statistics, profile).positions)
+        tables[profile] = table
+
+    return tables
+
+
+def write_tables(
+    layers: list[Layer],
+    path: Path,
+    statistics: ProfileStatistics | None = None,
+) -> list[Path]:
+    """
+    Write the profile tables in a columnar format (Parquet or Feather,
+    depending on the suffix of the path). The radial and phase tables
+    are written to separate files, with `_radial` and `_phase`
+    appended to the name of the file.
+
+    Args:
+        layers: The layers.
+        path: Path to the output (.parquet or .feather).
+        statistics: The statistics of the profiles (computed from the layers if not given).
+
+    Returns:
+        The paths to the tables.
+    """
+    path = Path(path)
+    if pyarrow is None:
+        raise RuntimeError(f"Writing '{path.suffix}' files requires pyarrow")
+
+    paths = []
+    for profile, table in profile_tables(layers, statistics).items():
+        table_path = path.with_name(f"{path.stem}_{profile}{path.suffix}")
+        if path.suffix == ".feather":
+            table.to_feather(table_path)
+        else:
+            table.to_parquet(table_path, index=False)
+        paths.append(table_path)
+
+    return paths
+
+
+# Export formats and the suffixes of their files
+EXPORT_FORMATS = {
+    "xlsx": ".xlsx",
+    "NumPy": ".npz",
+    "Parquet": ".parquet",
+    "Feather": ".feather",
+}
+
+
+def export_profiles(
+    layers: list[Layer],
+    path: Path,
+    statistics: ProfileStatistics | None = None,
+) -> list[Path]:
+    """
+    Export the profiles of a set of layers in the format
+    given by the suffix of the path.
+
+    Spreadsheets (.xlsx) hold only the statistics of the profiles, whereas
+    the other formats hold the profiles of each layer and their statistics.
+
+    Args:
+        layers: The layers.
+        path: Path to the output.
+        statistics: The statistics of the profiles (computed from the layers if not given).
+
+    Returns:
+        The paths to the exported files.
+    """
+    if statistics is None:
+        statistics = ProfileStatistics.from_layers(layers)
+
+    path = Path(path)
+    if path.suffix == ".xlsx":
+        write_statistics(statistics, path)
+    elif path.suffix == ".npz":
+        write_npz(layers, path, statistics)
+    elif path.suffix in (".parquet", ".feather"):
+        return write_tables(layers, path, statistics)
+    else:
+        raise ValueError(f"Unsupported export format '{path.suffix}'")
+
+    return [path]
+
+
+def write_profiles(
+    layers: list[Layer],
+    directory: Path,
+):
+    """
+    Write the profiles of each layer and a summary of the layers
+    as CSV files, with one column per layer.
+
+    Args:
+        layers: The layers.
+        directory: The output directory.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    names = [layer_name(layer) for layer in layers]
+
+    radial_df = pd.DataFrame(
+        np.column_stack([layer.radial_profile for layer in layers]),
+        columns=names,
+    )
+    radial_df.insert(0, "Normalised radius [a.u.]", layers[0].radial_range)
+    radial_df.to_csv(directory / "radial_profiles.csv", index=False)
+
+    phase_df = pd.DataFrame(
+        np.column_stack([layer.phase_profile for layer in layers]),
+        columns=names,
+    )
+    phase_df.insert(0, "Angle [deg]", layers[0].phase_range)
+    phase_df.to_csv(directory / "phase_profiles.csv", index=False)
+
+    layers_df = pd.DataFrame(
+        {
+            "Layer": names,
+            "Centre X": [layer.centre[0] for layer in layers],
+            "Centre Y": [layer.centre[1] for layer in layers],
+            "MBR": [layer.mbr for layer in layers],
+        }
+    )
+    layers_df.to_csv(directory / "layers.csv", index=False)
+
+
+def export_stack(
+    layers: list[Layer],
+    directory: Path,
+    statistics: ProfileStatistics | None = None,
+):
+    """
+    Write the profiles of the layers of a stack and their statistics
+    as CSV files, a spreadsheet, a NumPy archive and, if pyarrow
+    is installed, Parquet tables.
+
+    Args:
+        layers: The layers.
+        directory: The output directory.
+        statistics: The statistics of the profiles (computed from the layers if not given).
+    """
+    if statistics is None:
+        statistics = ProfileStatistics.from_layers(layers)
+
+    directory = Path(directory)
+    write_profiles(layers, directory)
+    write_statistics(statistics, directory / "statistics.xlsx")
+    write_npz(layers, directory / "profiles.npz", statistics)
+    if pyarrow is not None:
+        write_tables(layers, directory / "profiles.parquet", statistics)
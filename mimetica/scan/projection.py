@@ -0,0 +1,140 @@
+import numpy as np
+
+from mimetica.scan.mask import Mask
+
+
+class Projection:
+    """
+    A projection of a stack of layers along the stacking axis.
+
+    The projection is accumulated one layer at a time, so the layers do not
+    need to be in memory at the same time. Since the layers are binary,
+    every mode is derived from the number of layers with material
+    at each pixel:
+
+    - `sum`: The number of layers with material.
+    - `mean`: The fraction of layers with material.
+    - `max`: Whether any layer has material.
+
+    Layers can differ in shape, in which case the projection grows to cover
+    all of them. Layers are aligned at the origin (the coordinates of
+    the centres are shared by all layers) and pixels outside a layer
+    are counted as empty.
+
+    Several projections can be accumulated in parallel over different
+    subsets of the layers and combined with `merge`.
+    """
+
+    MODES = ("mean", "max", "sum")
+
+    def __init__(
+        self,
+        chunk_size: int = 256,
+    ):
+        """
+        Create an empty projection.
+
+        Args:
+            chunk_size: Number of rows unpacked at a time when adding a layer.
+        """
+        self.chunk_size = chunk_size
+        self.count = np.zeros((0, 0), dtype=np.uint32)
+        self.layers = 0
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.count.shape
+
+    def _grow(
+        self,
+        shape: tuple[int, int],
+    ):
+        """
+        Grow the projection to cover an area of the given shape.
+
+        Args:
+            shape: The shape to cover.
+        """
+        rows = max(self.shape[0], shape[0])
+        cols = max(self.shape[1], shape[1])
+        if (rows, cols) == self.shape:
+            return
+
+        count = np.zeros((rows, cols), dtype=np.uint32)
+        count[: self.shape[0], : self.shape[1]] = self.count
+        self.count = count
+
+    def add(
+        self,
+        mask: Mask,
+    ):
+        """
+        Add a layer to the projection.
+
+        The mask is unpacked in blocks of rows,
+        so a full copy of the layer is never made.
+
+        Args:
+            mask: The mask of the layer.
+        """
+        self._grow(mask.shape)
+
+        (rows, cols) = mask.shape
+        for start in range(0, rows, self.chunk_size):
+            stop = min(start + self.chunk_size, rows)
+            self.count[start:stop, :cols] += mask.rows(start, stop)
+
+        self.layers += 1
+
+    def merge(
+        self,
+        other: "Projection",
+    ) -> "Projection":
+        """
+        Add the layers of another projection to this one.
+
+        Args:
+            other: The other projection.
+
+        Returns:
+            This projection.
+        """
+        self._grow(other.shape)
+        self.count[: other.shape[0], : other.shape[1]] += other.count
+        self.layers += other.layers
+        return self
+
+    def image(
+        self,
+        mode: str = "mean",
+        normalise: bool = False,
+    ) -> np.ndarray:
+        """
+        Compute the projection.
+
+        Args:
+            mode: One of `mean`, `max` or `sum`.
+            normalise: Scale the sum to the range [0, 1] by its peak.
+                The mean and the maximum are always in that range.
+
+        Returns:
+            The projection as a floating-point array.
+        """
+        if mode not in Projection.MODES:
+            raise ValueError(
+                f"Invalid projection mode '{mode}' (expected one of {Projection.MODES})"
+            )
+
+        if mode == "max":
+            return (self.count > 0).astype(np.float32)
+
+        image = self.count.astype(np.float32)
+        if mode == "mean":
+            if self.layers > 0:
+                image /= self.layers
+        elif normalise:
+            peak = image.max()
+            if peak > 0:
+                image /= peak
+
+        return image
@@ -2,47 +2,77 @@ from pathlib import Path
 
 import numpy as np
 
+from concurrent.futures import Future
 from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
 
-import tempfile
+import contextvars
+import copy
+import queue
+import threading
+import time
+
+import os
+import platformdirs
 
 from PySide6.QtCore import Slot
 from PySide6.QtCore import Signal
 from PySide6.QtCore import QObject
+from PySide6.QtCore import QCoreApplication
 from PySide6.QtWidgets import QFileDialog
 
-import pandas as pd
-
-import shutil
-
 from mimetica import conf
 from mimetica import logger
 from mimetica import Layer
+from mimetica.scan import sampling
+from mimetica.scan import pipeline
+from mimetica.scan import volume
+from mimetica.scan.cache import ResultCache
+from mimetica.scan.mask import Mask
+from mimetica.scan.projection import Projection
+from mimetica.scan.statistics import ProfileStatistics
+from mimetica.scan.store import VolumeStore
+from mimetica.scan.volume import Page
+from mimetica.utils import profiling
 
 
 class Stack(QObject):
     update_progress = Signal(Path)
+    update_profile = Signal(int)
     set_canvas = Signal()
+    add_layer = Signal(int)
+    finished_loading = Signal()
+    plot = Signal()
     abort = Signal()
+    _profiles_ready = Signal(int, int, object)
 
     @staticmethod
     def make_layer(
-        path: str | Path,
+        path: str | Path | Page,
     ):
         """
-        Create a layer for the given image.
+        Create a layer for the given image in a worker process.
+
+        The mask of the layer is moved into shared memory, so only
+        its descriptor, the profiles and a small thumbnail of the image
+        (made from the decoded image or restored from the cache)
+        are pickled and sent back.
 
         Args:
-            path: Path to the image file.
+            path: Path to the image file or a page of a multi-page volume.
 
         Returns:
             A layer instance.
         """
-        return Layer(path)
+        layer = pipeline.make_layer(path, conf.cache_enabled, thumbnail=True)
+        layer.mask.share()
+        logger.debug(f"Sampling templates: {sampling.templates}")
+        return layer
 
     def __init__(
         self,
-        paths: list[Path],
+        paths: list[Path | Page],
         threshold: int = 70,
         *args,
         **kwargs,
@@ -51,24 +81,69 @@ class Stack(QObject):
         Create a stack of images.
 
         Args:
-            paths: A list of image paths.
+            paths: A list of image paths and / or pages of multi-page volumes.
             threshold: Binarisation threshold (only for RGB or greyscale images; currently unused)
         """
         super().__init__(*args, **kwargs)
 
         # Save the parameters
         # ==================================================
-        self.paths = sorted(paths)
+        self.paths = sorted(paths, key=volume.sort_key)
         self.threshold = threshold
 
         # Other attributes
         # ==================================================
-        self.layers = []
+        # Layers are loaded in the background and stored under the
+        # index of their path, so slots of layers that are still
+        # being loaded are None.
+        self.layers: list[Layer | None] = [None] * len(self.paths)
         self.active_layer = 0
 
-        # Create a merged stack
+        # On-disk store for the masks of the layers
+        # ==================================================
+        self.store = VolumeStore(
+            compression=conf.store_compression,
+            budget=conf.memory_budget * 2**20,
+        )
+
+        # Projection of the stack, available once all layers are loaded
+        # ==================================================
+        self.projection: Projection | None = None
+
+        # Statistics of the profiles, updated as each layer is loaded
+        # or its profiles are recomputed. The lock is shared by the
+        # thread loading the layers and the thread of the stack.
+        # ==================================================
+        self._statistics = ProfileStatistics()
+        self._statistics_lock = threading.Lock()
+
+        # Number of segments of the profiles in the statistics,
+        # changed (under the lock) when the profiles are recomputed
+        # ==================================================
+        self._segments = {
+            "radial": conf.radial_samples,
+            "phase": conf.phase_samples,
+        }
+
+        # Per-stage profile of the last load (if profiling is enabled)
+        # ==================================================
+        self.profile: profiling.Profile | None = None
+
+        # Worker pool for recomputing the profiles
         # ==================================================
-        self.merged: np.ndarray = None
+        self.executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+        self._futures = []
+        self._generation = 0
+        self._pending = 0
+        self._profiles_ready.connect(self._apply_profiles)
+
+        # Export requested while the profiles were being recomputed
+        # ==================================================
+        self._deferred_export: Path | None = None
+
+        # Set when loading is cancelled (e.g., the tab is closed)
+        # ==================================================
+        self._cancelled = threading.Event()
 
     def _set_active_layer(
         self,
@@ -82,128 +157,530 @@ class Stack(QObject):
         """
         self.active_layer = index
 
-    @Slot(int)
-    def _compute_radial_profile(
+    @property
+    def merged(self) -> np.ndarray | None:
+        """
+        The projection of the stack in the configured mode as an 8-bit image.
+
+        Returns:
+            The image (None until all layers are loaded).
+        """
+        if self.projection is None:
+            return None
+
+        return (
+            255 * self.projection.image(conf.projection_mode, normalise=True)
+        ).astype(np.uint8)
+
+    @staticmethod
+    def _accumulate(
+        partials: queue.SimpleQueue,
+        mask: Mask,
+    ):
+        """
+        Add a layer to one of the partial projections of the stack.
+
+        Each partial projection is used by one thread at a time,
+        so layers can be added to different ones in parallel.
+
+        Args:
+            partials: The partial projections that are not in use.
+            mask: The mask of the layer.
+        """
+        partial = partials.get()
+        try:
+            with profiling.stage("projection"):
+                partial.add(mask)
+        finally:
+            partials.put(partial)
+
+    @property
+    def loaded_layers(self) -> dict[int, Layer]:
+        """
+        The layers that have been loaded so far.
+
+        Returns:
+            A dictionary of layers keyed by their index.
+        """
+        return {
+            index: layer for index, layer in enumerate(self.layers) if layer is not None
+        }
+
+    @property
+    def statistics(self) -> ProfileStatistics:
+        """
+        The statistics of the profiles of the layers loaded so far.
+
+        Returns:
+            A copy of the statistics.
+        """
+        with self._statistics_lock:
+            return copy.deepcopy(self._statistics)
+
+    @staticmethod
+    def make_profiles(
+        layer: Layer,
+        radial_segments: int | None = None,
+        phase_segments: int | None = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        Derive new profiles for a layer without modifying it.
+
+        Args:
+            layer: The layer.
+            radial_segments: Number of radial segments (None to keep the current profile).
+            phase_segments: Number of phase segments (None to keep the current profile).
+
+        Returns:
+            The new profiles.
+        """
+        profiles = {}
+        if radial_segments is not None:
+            profiles.update(layer.make_radial_profile(radial_segments))
+        if phase_segments is not None:
+            profiles.update(layer.make_phase_profile(phase_segments))
+        return profiles
+
+    @Slot(int, int)
+    def _compute_profiles(
         self,
-        segments: int,
+        radial_segments: int | None = None,
+        phase_segments: int | None = None,
     ):
         """
-        Update the radial profile with a new number of segments.
+        Recompute the profiles of all layers with a new number of segments.
+
+        The profiles are computed by a pool of worker threads and
+        applied to the layers one by one as they become available.
+        Only the layers that have been loaded are updated; layers that
+        are still being loaded pick up the new number of segments
+        when they are added.
+        `update_profile` is emitted for each updated layer and `plot`
+        is emitted once all the layers have been updated.
+        The profiles are rebinned from the histograms of each layer,
+        so the images are not accessed again.
 
         Args:
-            segments: Number of radial segments.
+            radial_segments: Number of radial segments (None to keep the current profiles).
+            phase_segments: Number of phase segments (None to keep the current profiles).
         """
+        self._cancel_profiles()
+
+        # The statistics of the recomputed profiles are
+        # accumulated again as the new profiles are applied.
+        with self._statistics_lock:
+            if radial_segments is not None:
+                self._statistics.reset("radial")
+                self._segments["radial"] = radial_segments
+            if phase_segments is not None:
+                self._statistics.reset("phase")
+                self._segments["phase"] = phase_segments
+            layers = self.loaded_layers
+
+        generation = self._generation
+        self._pending = len(layers)
+
+        for index, layer in layers.items():
+            future = self.executor.submit(
+                Stack.make_profiles,
+                layer,
+                radial_segments,
+                phase_segments,
+            )
+            future.add_done_callback(
+                lambda future, index=index: self._emit_profiles(
+                    generation, index, future
+                )
+            )
+            self._futures.append(future)
 
-        for layer in self.layers:
-            layer.compute_radial_profile()
-        self.plot.emit()
+    def _cancel_profiles(self):
+        """
+        Cancel the recomputation of the profiles that is in progress.
+        Profiles that have already been computed but not
+        applied yet are discarded.
+        """
+        for future in self._futures:
+            future.cancel()
+        self._futures.clear()
+        self._generation += 1
 
-    @Slot(int)
-    def _compute_phase_profile(
+    def _emit_profiles(
         self,
-        segments: int,
+        generation: int,
+        index: int,
+        future: Future,
     ):
         """
-        Update the phase profile with a new number of segments.
+        Pass profiles computed by a worker on to the thread of the stack.
 
         Args:
-            segments: Number of phase segments.
+            generation: The generation of the recomputation.
+            index: Index of the layer.
+            future: The future holding the profiles.
         """
-        for layer in self.layers:
-            layer.compute_phase_profile()
+        if future.cancelled():
+            return
+
+        # A failed layer is still passed on so that the recomputation completes
+        try:
+            profiles = future.result()
+        except Exception as e:
+            logger.error(f"Failed to recompute the profiles of layer {index}: {e}")
+            profiles = None
+        self._profiles_ready.emit(generation, index, profiles)
+
+    @Slot(int, int, object)
+    def _apply_profiles(
+        self,
+        generation: int,
+        index: int,
+        profiles: dict[str, np.ndarray] | None,
+    ):
+        """
+        Apply new profiles to a layer.
 
-        self.plot.emit()
+        Args:
+            generation: The generation of the recomputation.
+            index: Index of the layer.
+            profiles: The new profiles (None if they could not be computed,
+                in which case the layer is left out of the statistics).
+        """
+        if generation != self._generation:
+            return
+
+        if profiles is not None:
+            self.layers[index].set_profiles(profiles)
+            updated = tuple(
+                profile
+                for profile in ProfileStatistics.PROFILES
+                if f"{profile}_profile" in profiles
+            )
+            with self._statistics_lock:
+                self._statistics.add(self.layers[index], updated)
+        self.update_profile.emit(index)
+
+        self._pending -= 1
+        if self._pending == 0:
+            self._futures.clear()
+            self.plot.emit()
+
+            if self._deferred_export is not None:
+                (path, self._deferred_export) = (self._deferred_export, None)
+                self._start_export(path)
 
     @Slot()
-    def _export_profile_statistics(self):
+    def _export_profiles(self):
         """
-        Export the mean and standard deviation of the
-        radial and phase profiles.
+        Export the radial and phase profiles.
+
+        The format is picked in the file dialog: spreadsheets hold the mean
+        and standard deviation of the profiles, whereas NumPy archives and
+        (if pyarrow is installed) Parquet and Feather tables also hold
+        the profile of each layer. The file is written by a worker thread
+        so that large stacks do not block the GUI. If the profiles are
+        being recomputed, the export starts once they are all updated,
+        so that all layers are exported with the same number of segments.
         """
 
-        radial_profiles = np.vstack([layer.radial_profile for layer in self.layers])
-        phase_profiles = np.vstack([layer.phase_profile for layer in self.layers])
+        formats = {
+            name: suffix
+            for name, suffix in pipeline.EXPORT_FORMATS.items()
+            if pipeline.pyarrow is not None or suffix in (".xlsx", ".npz")
+        }
 
-        radial_mean = radial_profiles.mean(axis=0)
-        radial_sd = radial_profiles.std(axis=0)
-        phase_mean = phase_profiles.mean(axis=0)
-        phase_sd = phase_profiles.std(axis=0)
+        (save_fname, selected) = QFileDialog.getSaveFileName(
+            None,
+            "Save file...",
+            filter=";;".join(f"{name} (*{suffix})" for name, suffix in formats.items()),
+        )
 
-        with tempfile.TemporaryDirectory() as td:
-            tmp_fname = Path(td) / "stats.xlsx"
+        if save_fname == "":
+            return
 
-            with pd.ExcelWriter(tmp_fname, engine="openpyxl") as writer:
+        save_fname = Path(save_fname)
+        if save_fname.suffix not in formats.values():
+            suffix = formats.get(selected.split(" (")[0], ".xlsx")
+            save_fname = save_fname.with_name(save_fname.name + suffix)
 
-                radial_df = pd.DataFrame(
-                    {
-                        "Normalised radius [a.u.]": np.linspace(
-                            0.0, 1.0, conf.radial_samples + 1
-                        )[1:],
-                        "Radial mean": radial_mean,
-                        "Radial SD": radial_sd,
-                    }
-                )
-                radial_df.to_excel(
-                    writer, sheet_name="Radial profile stats", index=False
-                )
+        save_fname = save_fname.resolve().absolute()
+        if self._pending > 0:
+            logger.info(f"Exporting to '{save_fname}' once the profiles are updated")
+            self._deferred_export = save_fname
+            return
 
-                phase_df = pd.DataFrame(
-                    {
-                        "Angle [deg]": np.linspace(
-                            0.0, 360.0, conf.phase_samples, endpoint=False
-                        ),
-                        "Phase mean": phase_mean,
-                        "Phase SD": phase_sd,
-                    }
-                )
-                phase_df.to_excel(writer, sheet_name="Phase profile stats", index=False)
+        self._start_export(save_fname)
 
-            save_fname = QFileDialog.getSaveFileName(
-                None,
-                "Save file...",
-                filter="xlsx (*.xlsx)",
-            )[0]
+    def _snapshot(self) -> tuple[list[Layer], ProfileStatistics]:
+        """
+        Copy the profiles of the loaded layers and their statistics,
+        so that a worker can export them while they are recomputed.
 
-            if save_fname is not None:
-                save_fname = Path(save_fname)
-                shutil.copy2(tmp_fname, save_fname)
-                logger.info(
-                    f"Statistics exported to '{save_fname.resolve().absolute()}'"
-                )
+        Returns:
+            Copies of the layers (sharing everything but the profiles)
+            and of the statistics.
+        """
+        with self._statistics_lock:
+            layers = []
+            for layer in self.loaded_layers.values():
+                layer = copy.copy(layer)
+                for name in ("radial_range", "radial_profile", "phase_range", "phase_profile"):
+                    setattr(layer, name, getattr(layer, name).copy())
+                layers.append(layer)
+            return layers, copy.deepcopy(self._statistics)
+
+    def _start_export(
+        self,
+        path: Path,
+    ):
+        """
+        Export a snapshot of the profiles in a worker thread.
+
+        Args:
+            path: Path to the output.
+        """
+        (layers, statistics) = self._snapshot()
+        future = self.executor.submit(
+            pipeline.export_profiles,
+            layers,
+            path,
+            statistics,
+        )
+        future.add_done_callback(Stack._exported)
+
+    @staticmethod
+    def _exported(future: Future):
+        """
+        Report the outcome of an export.
+
+        Args:
+            future: The future of the export.
+        """
+        try:
+            paths = future.result()
+        except Exception as e:
+            logger.error(f"Failed to export the profiles: {e}")
+            return
+
+        for path in paths:
+            logger.info(f"Profiles exported to '{path}'")
 
     @Slot()
     def process(self):
         """
         Process a stack of images.
+
+        The active layer is loaded first and the canvas is set up as soon
+        as it is ready. The remaining layers are loaded in the background
+        and announced with `add_layer` in the order in which they are
+        completed. `finished_loading` is emitted once all layers are loaded.
         """
         logger.info(f"Loading stack...")
 
-        # Layer factory
+        # Profiling is set up for each load so that
+        # changes to the setting take effect
+        profile = conf.profiling
+        profiling.enable(profile)
+        try:
+            self._load(profile)
+        finally:
+            # Stop tracing memory allocations even if loading fails
+            profiling.enable(False)
+
+    def _load(
+        self,
+        profile: bool,
+    ):
+        """
+        Load the layers of the stack (see `process`).
+
+        Args:
+            profile: Whether the load is profiled.
+        """
+        start = time.perf_counter()
+
+        # Hand the stack over to the main thread so that the profiles
+        # computed by the worker pool are applied there while the
+        # layers are being loaded in this thread.
         # ==================================================
-        with ProcessPoolExecutor() as executor:
-            for layer in executor.map(Stack.make_layer, self.paths):
-                self.layers.append(layer)
-                self.update_progress.emit(layer.path)
+        self.moveToThread(QCoreApplication.instance().thread())
 
-        self._set_active_layer()
+        # Layer factory
+        # ==================================================
+        first = self.active_layer
+        order = [first] + [index for index in range(len(self.paths)) if index != first]
 
-        # Calibrate the stack based on all the images
+        # The projection is accumulated as the layers arrive
+        # by a few partial projections that are combined at the end
         # ==================================================
-        for layer in self.layers:
+        partials = queue.SimpleQueue()
+        for _ in range(min(4, os.cpu_count() or 1)):
+            partials.put(Projection())
+        reductions = []
 
-            if self.merged is None:
-                self.merged = layer.image.copy().astype(np.float32)
-            else:
-                self.merged += layer.image
+        with ProcessPoolExecutor() as executor:
+            futures = {
+                executor.submit(
+                    profiling.call,
+                    profile,
+                    Stack.make_layer,
+                    self.paths[index],
+                ): index
+                for index in order
+            }
+
+            canvas_set = False
+            worker_profiles = []
+            try:
+                for future in as_completed(futures):
+                    if self._cancelled.is_set():
+                        break
+                    index = futures[future]
+                    (layer, worker_profile) = future.result()
+                    worker_profiles.append(worker_profile)
+
+                    # The number of segments may have changed while loading
+                    layer.compute_radial_profile(self._segments["radial"])
+                    layer.compute_phase_profile(self._segments["phase"])
+
+                    # Move the mask out of memory
+                    with profiling.stage("store"):
+                        layer.mask = self.store.put(index, layer.mask)
+
+                    # The statistics are updated together with the layers
+                    # so that a recomputation of the profiles that starts
+                    # in the meantime covers this layer exactly once.
+                    with self._statistics_lock:
+                        # A recomputation may have started since the profiles
+                        # were computed, in which case they are computed again
+                        # with its number of segments.
+                        if len(layer.radial_profile) != self._segments["radial"]:
+                            layer.compute_radial_profile(self._segments["radial"])
+                        if len(layer.phase_profile) != self._segments["phase"]:
+                            layer.compute_phase_profile(self._segments["phase"])
+                        self._statistics.add(layer)
+                        self.layers[index] = layer
+                    self.update_progress.emit(layer.path)
+                    # The projection is profiled with this load
+                    reductions.append(
+                        self.executor.submit(
+                            contextvars.copy_context().run,
+                            Stack._accumulate,
+                            partials,
+                            layer.mask,
+                        )
+                    )
+
+                    # Layers completed before the active one are
+                    # picked up when the canvas is set up.
+                    if index == first:
+                        self.set_canvas.emit()
+                        canvas_set = True
+                    elif canvas_set:
+                        self.add_layer.emit(index)
+            finally:
+                Stack._discard(futures)
+
+        if self._cancelled.is_set():
+            logger.info(f"Loading cancelled")
+            self.abort.emit()
+            return
+
+        self.store.flush()
+
+        # Keep the result cache within its size limit
+        # ==================================================
+        if conf.cache_enabled:
+            evicted, freed = ResultCache().prune(conf.cache_size * 2**20)
+            if evicted > 0:
+                logger.info(
+                    f"Evicted {evicted} cache entries ({freed / 2**20:.1f} MiB)"
+                )
 
-        # Scale the merged stack
+        # Combine the partial projections
+        # ==================================================
+        for reduction in reductions:
+            reduction.result()
+        projection = Projection()
+        while not partials.empty():
+            projection.merge(partials.get())
+        self.projection = projection
+
+        # Combine the profiles of this process and the workers
         # ==================================================
-        minval = self.merged.min()
-        maxval = self.merged.max()
-        self.merged = (255 * (self.merged - minval) / (maxval - minval)).astype(
-            np.uint8
+        if profile:
+            self.profile = profiling.collect()
+            for worker_profile in worker_profiles:
+                self.profile.merge(worker_profile)
+            self._report_profile(time.perf_counter() - start)
+
+        self.finished_loading.emit()
+
+    def cancel(self):
+        """
+        Stop loading the stack.
+
+        Layers that have not been started are dropped and `abort`
+        is emitted instead of `finished_loading`. This can be called
+        from any thread.
+        """
+        self._cancelled.set()
+
+    def close(self):
+        """
+        Stop recomputing the profiles, release the worker threads and
+        remove the masks of the layers from disk. This should only be
+        called once loading has stopped and the layers are no longer drawn.
+        """
+        self._cancel_profiles()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.store.close()
+
+    @staticmethod
+    def _discard(
+        futures: dict[Future, int],
+    ):
+        """
+        Drop the layers that were not collected when loading stops early.
+
+        Pending layers are cancelled and the ones already being made are
+        waited for. Receiving a layer attaches its mask to the shared
+        memory block of the worker and removes the name of the block,
+        so the memory is released once the layer is dropped.
+
+        Args:
+            futures: The futures of the layers being loaded.
+        """
+        for future in futures:
+            future.cancel()
+
+        for future in futures:
+            if future.cancelled():
+                continue
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    def _report_profile(
+        self,
+        elapsed: float,
+    ):
+        """
+        Log the profile of the last load and write it to a trace
+        in the log directory.
+
+        Args:
+            elapsed: Wall time of the load in seconds.
+        """
+        logger.info(
+            f"Loaded {len(self.loaded_layers)} layers in {elapsed:.2f} s "
+            f"(stage times are summed over all workers)"
         )
+        self.profile.log()
 
-        # Set the stack on the canvas
-        # ==================================================
-        self.set_canvas.emit()
+        trace = Path(platformdirs.user_log_dir("mimetica", "Mimetica")) / (
+            f"trace-{time.strftime('%Y%m%d-%H%M%S')}.json"
+        )
+        self.profile.write_trace(trace)
+        logger.info(f"Trace written to '{trace}'")
@@ -0,0 +1,183 @@
+import numpy as np
+
+from mimetica.scan.layer import Layer
+
+
+class RunningStatistics:
+    """
+    Online statistics of a set of profiles, computed bin by bin.
+
+    The mean and variance are updated with Welford's algorithm as each
+    profile is added, so the profiles do not need to be kept. Bins that
+    are not finite (NaN or infinite) are skipped, so the number of values
+    can differ between bins.
+
+    The standard deviation is the population standard deviation,
+    like `np.std`.
+    """
+
+    def __init__(self):
+        """
+        Create empty statistics.
+        """
+        self.positions: np.ndarray | None = None
+        self.count = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0)
+        self.m2 = np.zeros(0)
+        self.min = np.zeros(0)
+        self.max = np.zeros(0)
+
+    def __len__(self) -> int:
+        return len(self.count)
+
+    def _resize(
+        self,
+        size: int,
+    ):
+        """
+        Allocate the bins for profiles of the given size.
+
+        Args:
+            size: The number of bins.
+        """
+        if len(self) == size:
+            return
+        if len(self) > 0:
+            raise ValueError(f"Expected a profile with {len(self)} bins, got {size}")
+
+        self.count = np.zeros(size, dtype=np.int64)
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.min = np.full(size, np.inf)
+        self.max = np.full(size, -np.inf)
+
+    def add(
+        self,
+        values: np.ndarray,
+        positions: np.ndarray | None = None,
+    ):
+        """
+        Add a profile.
+
+        Args:
+            values: The profile.
+            positions: Positions of the bins (kept for reference).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        self._resize(len(values))
+        if positions is not None:
+            self.positions = positions
+
+        valid = np.isfinite(values)
+        self.count += valid
+        delta = np.where(valid, values - self.mean, 0.0)
+        self.mean += np.divide(delta, self.count, out=np.zeros_like(delta), where=valid)
+        self.m2 += delta * np.where(valid, values - self.mean, 0.0)
+        np.fmin(self.min, np.where(valid, values, np.inf), out=self.min)
+        np.fmax(self.max, np.where(valid, values, -np.inf), out=self.max)
+
+    @property
+    def variance(self) -> np.ndarray:
+        return np.divide(
+            self.m2,
+            self.count,
+            out=np.full(len(self), np.nan),
+            where=self.count > 0,
+        )
+
+    @property
+    def sd(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+
+class ProfileStatistics:
+    """
+    Online statistics of the radial and phase profiles of a stack.
+    """
+
+    PROFILES = ("radial", "phase")
+
+    def __init__(self):
+        """
+        Create empty statistics.
+        """
+        self.radial = RunningStatistics()
+        self.phase = RunningStatistics()
+
+    @staticmethod
+    def from_layers(layers: list[Layer]) -> "ProfileStatistics":
+        """
+        Compute the statistics of a set of layers.
+
+        Args:
+            layers: The layers, with their profiles computed.
+
+        Returns:
+            The statistics.
+        """
+        statistics = ProfileStatistics()
+        for layer in layers:
+            statistics.add(layer)
+        return statistics
+
+    @property
+    def count(self) -> int:
+        """
+        The number of layers added so far.
+        """
+        return int(max(self.radial.count.max(initial=0), self.phase.count.max(initial=0)))
+
+    def add(
+        self,
+        layer: Layer,
+        profiles: tuple[str, ...] = PROFILES,
+    ):
+        """
+        Add the profiles of a layer.
+
+        Args:
+            layer: The layer.
+            profiles: The profiles to add.
+        """
+        for profile in profiles:
+            getattr(self, profile).add(
+                getattr(layer, f"{profile}_profile"),
+                getattr(layer, f"{profile}_range"),
+            )
+
+    def reset(
+        self,
+        profile: str,
+    ):
+        """
+        Discard the statistics of one of the profiles.
+
+        Args:
+            profile: The profile ("radial" or "phase").
+        """
+        setattr(self, profile, RunningStatistics())
+
+    def summary(self) -> dict[str, np.ndarray]:
+        """
+        The statistics of both profiles as arrays.
+
+        Returns:
+            The sample positions (`<profile>_range`) and the mean, SD,
+            minimum, maximum and count of each bin (`<profile>_mean`,
+            `<profile>_sd`, `<profile>_min`, `<profile>_max` and
+            `<profile>_count`) of the radial and phase profiles.
+        """
+        summary = {}
+        for profile in self.PROFILES:
+            statistics = getattr(self, profile)
+            summary.update(
+                {
+                    f"{profile}_range": statistics.positions,
+                    f"{profile}_mean": statistics.mean.copy(),
+                    f"{profile}_sd": statistics.sd,
+                    f"{profile}_min": statistics.min.copy(),
+                    f"{profile}_max": statistics.max.copy(),
+                    f"{profile}_count": statistics.count.copy(),
+                }
+            )
+        return summary
@@ -0,0 +1,242 @@
+from collections import OrderedDict
+from pathlib import Path
+
+import lzma
+import shutil
+import tempfile
+import threading
+import weakref
+import zlib
+
+import numpy as np
+import platformdirs
+
+from mimetica.scan.mask import Mask
+
+
+class VolumeStore:
+    """
+    An on-disk store for the masks of the layers in a stack.
+
+    Masks are appended to chunks in the order in which they are stored.
+    Each chunk is a flat `.npy` file holding the packed bits of up to
+    `chunk_size` masks, optionally compressed with zlib or lzma, and is
+    memory-mapped once it has been written. Masks are read back lazily
+    through `StoredMask`, so the layers of a stack do not need to be
+    kept in memory.
+
+    Memory use is bounded by `budget`, which covers the chunk that is being
+    filled and an LRU cache of decompressed masks. Uncompressed masks are
+    read directly from the memory-mapped chunks and left to the page cache.
+
+    The store lives in a temporary directory that is removed when
+    the store is closed or garbage-collected.
+    """
+
+    COMPRESSION = {
+        "none": (None, None),
+        "zlib": (zlib.compress, zlib.decompress),
+        "lzma": (lzma.compress, lzma.decompress),
+    }
+
+    def __init__(
+        self,
+        root: Path | None = None,
+        chunk_size: int = 64,
+        compression: str = "none",
+        budget: int = 1024 * 2**20,
+    ):
+        """
+        Create an empty store.
+
+        Args:
+            root: The parent directory of the store (defaults to the user cache directory).
+            chunk_size: Maximal number of masks per chunk.
+            compression: One of `none`, `zlib` or `lzma`.
+            budget: Maximal number of bytes of mask data held in memory.
+        """
+        if compression not in VolumeStore.COMPRESSION:
+            raise ValueError(
+                f"Invalid compression '{compression}' (expected one of {tuple(VolumeStore.COMPRESSION)})"
+            )
+
+        if root is None:
+            root = Path(platformdirs.user_cache_dir("mimetica", "Mimetica")) / "volumes"
+        Path(root).mkdir(parents=True, exist_ok=True)
+
+        self.root = Path(tempfile.mkdtemp(prefix="volume-", dir=root))
+        self.chunk_size = chunk_size
+        self.compression = compression
+        self.budget = budget
+        (self._compress, self._decompress) = VolumeStore.COMPRESSION[compression]
+
+        # Location of each mask: (chunk, offset, size, shape of the bits)
+        # ==================================================
+        self.index: dict[int, tuple[int, int, int, tuple[int, int]]] = {}
+        self.chunks: list[np.ndarray] = []
+
+        # Chunk being filled
+        # ==================================================
+        self._buffer: dict[int, bytes] = {}
+        self._buffer_nbytes = 0
+
+        # Decompressed masks
+        # ==================================================
+        self._cache = OrderedDict()
+        self._cache_nbytes = 0
+
+        self._lock = threading.Lock()
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.root, True)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        The number of bytes of mask data held in memory.
+        """
+        return self._buffer_nbytes + self._cache_nbytes
+
+    def put(
+        self,
+        key: int,
+        mask: Mask,
+    ) -> "StoredMask":
+        """
+        Add a mask to the store.
+
+        Args:
+            key: The key of the mask (the index of the layer).
+            mask: The mask.
+
+        Returns:
+            A mask that reads its bits from the store.
+        """
+        bits = np.ascontiguousarray(mask.bits)
+        data = bits.tobytes()
+        if self._compress is not None:
+            data = self._compress(data)
+
+        with self._lock:
+            offset = self._buffer_nbytes
+            self.index[key] = (len(self.chunks), offset, len(data), bits.shape)
+            self._buffer[key] = data
+            self._buffer_nbytes += len(data)
+
+            if (
+                len(self._buffer) >= self.chunk_size
+                or self._buffer_nbytes >= self.budget // 4
+            ):
+                self._flush()
+
+            self._evict()
+
+        return StoredMask(self, key, mask.shape)
+
+    def flush(self):
+        """
+        Write the chunk that is being filled to disk.
+        """
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if len(self._buffer) == 0:
+            return
+
+        path = self.root / f"chunk-{len(self.chunks):06d}.npy"
+        np.save(path, np.frombuffer(b"".join(self._buffer.values()), dtype=np.uint8))
+        self.chunks.append(np.load(path, mmap_mode="r"))
+
+        self._buffer.clear()
+        self._buffer_nbytes = 0
+
+    def _evict(self):
+        """
+        Drop the least recently used decompressed masks
+        until the store is within its budget.
+        """
+        while len(self._cache) > 0 and self.nbytes > self.budget:
+            (_, bits) = self._cache.popitem(last=False)
+            self._cache_nbytes -= bits.nbytes
+
+    def bits(
+        self,
+        key: int,
+    ) -> np.ndarray:
+        """
+        Read the packed bits of a mask.
+
+        Args:
+            key: The key of the mask.
+
+        Returns:
+            The packed bits.
+        """
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+            (chunk, offset, size, shape) = self.index[key]
+            if key in self._buffer:
+                # The chunk is still being filled
+                data = np.frombuffer(self._buffer[key], dtype=np.uint8)
+            else:
+                data = self.chunks[chunk][offset : offset + size]
+
+            if self._decompress is None:
+                return data.reshape(shape)
+
+            bits = np.frombuffer(self._decompress(data), dtype=np.uint8).reshape(shape)
+            self._cache[key] = bits
+            self._cache_nbytes += bits.nbytes
+            self._evict()
+            return bits
+
+    def close(self):
+        """
+        Remove the store from disk.
+        """
+        with self._lock:
+            self.chunks.clear()
+            self._buffer.clear()
+            self._cache.clear()
+            self._buffer_nbytes = 0
+            self._cache_nbytes = 0
+        self._finalizer()
+
+
+class StoredMask(Mask):
+    """
+    A mask whose bits are read from a `VolumeStore` on demand.
+    """
+
+    def __init__(
+        self,
+        store: VolumeStore,
+        key: int,
+        shape: tuple[int, int],
+    ):
+        """
+        Create a reference to a mask in a store.
+
+        Args:
+            store: The store.
+            key: The key of the mask.
+            shape: The shape of the unpacked mask.
+        """
+        self.store = store
+        self.key = key
+        self.shape = tuple(shape)
+        self._name = None
+        self._shm = None
+
+    @property
+    def bits(self) -> np.ndarray:
+        return self.store.bits(self.key)
+
+    def __reduce__(self):
+        # Pickled masks are detached from the store
+        return (Mask.from_bits, (np.array(self.bits), self.shape))
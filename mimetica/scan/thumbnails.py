@@ -0,0 +1,93 @@
+import numpy as np
+import skimage as ski
+
+from mimetica.scan.mask import Mask
+
+
+# Height of the thumbnails of the layers (in pixels)
+THUMBNAIL_HEIGHT = 128
+
+
+def _scale(dtype: np.dtype) -> float:
+    """
+    The factor that maps the values of an image to [0, 1].
+
+    Floating-point images are expected in [0, 1] already and
+    integer images are scaled by the range of their type.
+
+    Args:
+        dtype: The type of the image.
+
+    Returns:
+        The factor.
+    """
+    if np.issubdtype(dtype, np.integer):
+        return 1.0 / np.iinfo(dtype).max
+    return 1.0
+
+
+def downsample(
+    image: np.ndarray,
+    height: int = THUMBNAIL_HEIGHT,
+) -> np.ndarray:
+    """
+    Create a thumbnail of an image.
+
+    The image is first reduced by averaging blocks of pixels, which is
+    cheap even for large images, and the result is then resized to the
+    exact height. Images that are no taller than the thumbnail are only
+    converted to 8 bits.
+
+    Args:
+        image: The image (greyscale) in its original orientation.
+        height: Height of the thumbnail.
+
+    Returns:
+        The thumbnail as a contiguous 8-bit image.
+    """
+    scale = _scale(image.dtype)
+
+    (rows, cols) = image.shape
+    if rows > height:
+        size = (height, max(1, round(cols * height / rows)))
+        factor = rows // height
+        if factor > 1:
+            # Rows are summed first, which only adds contiguous rows
+            (rows, cols) = (rows // factor, cols // factor)
+            image = (
+                image[: rows * factor, : cols * factor]
+                .reshape(rows, factor, cols * factor)
+                .sum(axis=1, dtype=np.float32)
+                .reshape(rows, cols, factor)
+                .sum(axis=2)
+            ) / factor**2
+        image = ski.transform.resize(
+            image.astype(np.float32),
+            size,
+            order=1,
+            preserve_range=True,
+            anti_aliasing=False,
+        )
+
+    return np.ascontiguousarray(
+        np.rint(255 * np.clip(scale * image, 0.0, 1.0)).astype(np.uint8)
+    )
+
+
+def from_mask(
+    mask: Mask,
+    height: int = THUMBNAIL_HEIGHT,
+) -> np.ndarray:
+    """
+    Create a thumbnail of a layer from its mask when the image
+    is not available (e.g., for results restored from the cache).
+
+    Args:
+        mask: The mask of the layer.
+        height: Height of the thumbnail.
+
+    Returns:
+        The thumbnail as a contiguous 8-bit image.
+    """
+    # Layers are stored transposed and flipped
+    return downsample(np.fliplr(mask.unpack()).T, height)
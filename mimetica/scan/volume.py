@@ -0,0 +1,202 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple
+
+import threading
+
+import numpy as np
+import skimage as ski
+
+from PIL import Image
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+
+TIFF_EXTENSIONS = {".tif", ".tiff"}
+
+# Maximal number of volumes kept open by each process
+MAX_OPEN_VOLUMES = 4
+
+# Volumes kept open for reading pages, the most recently used last
+_volumes: OrderedDict[Path, object] = OrderedDict()
+_volumes_lock = threading.Lock()
+
+
+class Page(NamedTuple):
+    """
+    A single page of a multi-page TIFF volume.
+    """
+
+    path: Path
+    index: int
+
+    def __str__(self) -> str:
+        return f"{self.path} [page {self.index}]"
+
+
+def _open(path: Path):
+    """
+    Open a volume.
+
+    Args:
+        path: Path to the volume.
+
+    Returns:
+        A `tifffile.TiffFile` or, if tifffile is not available,
+        a PIL image.
+    """
+    if tifffile is not None:
+        return tifffile.TiffFile(path)
+    return Image.open(path)
+
+
+def _cached(path: Path):
+    """
+    Open a volume, keeping it open for reading further pages.
+
+    Locating a page requires walking the chain of pages that precede it,
+    so the worker processes keep the most recently used volumes open
+    instead of opening them for every page. The least recently used
+    volume is closed when more than `MAX_OPEN_VOLUMES` are open.
+
+    Args:
+        path: Path to the volume.
+
+    Returns:
+        The volume (see `_open`).
+    """
+    with _volumes_lock:
+        volume = _volumes.pop(path, None)
+        if volume is None:
+            volume = _open(path)
+        _volumes[path] = volume
+
+        while len(_volumes) > MAX_OPEN_VOLUMES:
+            (_, evicted) = _volumes.popitem(last=False)
+            evicted.close()
+
+        return volume
+
+
+def count_pages(path: Path) -> int:
+    """
+    Count the pages of a TIFF file.
+
+    Args:
+        path: Path to the file.
+
+    Returns:
+        The number of pages.
+    """
+    # The volume is closed again, since the pages are read
+    # by the worker processes rather than by this one.
+    with _open(Path(path)) as volume:
+        if tifffile is not None:
+            return len(volume.pages)
+        return getattr(volume, "n_frames", 1)
+
+
+def read_page(
+    path: Path,
+    index: int,
+) -> np.ndarray:
+    """
+    Read a single page of a volume.
+
+    Uncompressed pages are memory-mapped if tifffile is available,
+    so only the pixels that are accessed are read from disk.
+    Otherwise, the page is decoded on its own.
+
+    Args:
+        path: Path to the volume.
+        index: Index of the page.
+
+    Returns:
+        The page as a greyscale image.
+    """
+    volume = _cached(Path(path))
+
+    if tifffile is not None:
+        page = volume.pages[index]
+        if page.is_memmappable:
+            image = np.memmap(
+                volume.filehandle.path,
+                dtype=np.dtype(volume.byteorder + page.dtype.char),
+                mode="r",
+                offset=page.dataoffsets[0],
+                shape=page.shape,
+            )
+        else:
+            image = page.asarray()
+    else:
+        volume.seek(index)
+        image = np.asarray(volume)
+
+    if image.ndim == 3:
+        if image.shape[-1] == 4:
+            image = ski.color.rgba2rgb(image)
+        image = ski.color.rgb2gray(image)
+
+    return image
+
+
+def page_shape(
+    path: Path,
+    index: int,
+) -> tuple[int, ...]:
+    """
+    Read the shape of a page without decoding it.
+
+    Args:
+        path: Path to the volume.
+        index: Index of the page.
+
+    Returns:
+        The shape of the page.
+    """
+    with _open(Path(path)) as volume:
+        if tifffile is not None:
+            return volume.pages[index].shape
+
+        volume.seek(index)
+        return volume.size[::-1]
+
+
+def sort_key(source: Path | Page) -> tuple[Path, int]:
+    """
+    A key for sorting images and pages of volumes together,
+    by file and then by page.
+
+    Args:
+        source: Path to an image file or a page of a multi-page volume.
+
+    Returns:
+        The key.
+    """
+    if isinstance(source, Page):
+        return (Path(source.path), source.index)
+    return (Path(source), -1)
+
+
+def expand(paths: list[Path]) -> list[Path | Page]:
+    """
+    Replace multi-page TIFF files with their individual pages.
+
+    Args:
+        paths: Paths to image files.
+
+    Returns:
+        The image files and pages making up the stack.
+    """
+    sources = []
+    for path in paths:
+        path = Path(path)
+        if path.suffix.lower() in TIFF_EXTENSIONS and (pages := count_pages(path)) > 1:
+            sources.extend(Page(path, index) for index in range(pages))
+        else:
+            sources.append(path)
+
+    return sources
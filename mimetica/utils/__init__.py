@@ -1,7 +1,4 @@
 from .functions import (
     compute_minimal_bounding_circle,
     draw_sorted_circle,
-    as_rgba,
-    as_hex,
-    get_colour,
 )
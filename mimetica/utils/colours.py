@@ -0,0 +1,70 @@
+from PySide6.QtGui import QColor
+from PySide6.QtCore import QObject
+from PySide6.QtWidgets import QColorDialog
+
+
+def as_rgba(colour: QColor) -> str:
+    """
+    Convert a QColor isntance (including opacity) into RGBA format
+    suitable for use in a stylesheet.
+
+    The R, G and B values are between 0 and 255, and the opacity
+    is between 0 and 1.
+
+    Args:
+        colour:
+            A QColor instance.
+
+    Returns:
+        RGBA-formatted string.
+    """
+    return ",".join(
+        str(c)
+        for c in [
+            colour.red(),
+            colour.green(),
+            colour.blue(),
+            colour.alphaF(),
+        ]
+    )
+
+
+def as_hex(colour: QColor) -> str:
+    """
+    Convert a QColor isntance (including opacity) into hex format.
+
+    Args:
+        colour:
+            A QColor instance.
+
+    Returns:
+        The hex representation.
+    """
+    return "#" + "".join(
+        [
+            f"{colour.red():02X}",
+            f"{colour.green():02X}",
+            f"{colour.blue():02X}",
+            f"{colour.alpha():02X}",
+        ]
+    )
+
+
+def get_colour(
+    initial: QColor = None,
+    parent: QObject = None,
+    title: str = "Pick a colour",
+) -> QColor:
+    """
+    Get a QColor from a QColorDialog.
+
+    Returns:
+        The selected colour.
+    """
+
+    return QColorDialog.getColor(
+        initial,
+        parent,
+        title,
+        QColorDialog.ColorDialogOption.ShowAlphaChannel,
+    )
@@ -4,6 +4,8 @@ from PySide6.QtCore import QSettings
 from PySide6.QtGui import QColor
 from omegaconf import OmegaConf
 
+from mimetica.scan import sampling
+
 @dataclass
 class Conf(QSettings):
     WindowGeometry: str = "window/geometry"
@@ -14,9 +16,16 @@ class Conf(QSettings):
     InactiveLayerColour: str = "layer/inactive/colour"
     ActiveLayerColour: str = "layer/active/colour"
     LayerContourColour: str = "layer/contour/colour"
-    # ShowStack: bool = "stack/show"
+    ShowStack: bool = "stack/show"
+    ProjectionMode: str = "stack/projection"
     RadialSamples: int = "analysis/radial_samples"
     PhaseSamples: int = "analysis/phase_samples"
+    CacheEnabled: bool = "cache/enabled"
+    CacheSize: int = "cache/size"
+    StoreCompression: str = "store/compression"
+    MemoryBudget: int = "store/budget"
+    Profiling: bool = "profiling/enabled"
+    CineRate: int = "cine/fps"
 
     def __init__(self, *args, **kwargs):
         super().__init__("Mimetica", "Mimetica", *args, **kwargs)
@@ -86,6 +95,22 @@ class Conf(QSettings):
     ):
         self.setValue(Conf.ActiveLayerColour, value)
 
+    # Inactive layer colour (used for the projection of the stack)
+    @property
+    def inactive_layer_colour(self) -> QColor:
+        return self.value(
+            Conf.InactiveLayerColour,
+            QColor(147, 147, 147, 160),
+            QColor,
+        )
+
+    @inactive_layer_colour.setter
+    def inactive_layer_colour(
+        self,
+        value: QColor,
+    ):
+        self.setValue(Conf.InactiveLayerColour, value)
+
     # Layer contour colour
     @property
     def layer_contour_colour(self) -> QColor:
@@ -114,10 +139,22 @@ class Conf(QSettings):
     ):
         self.setValue(Conf.ShowStack, value)
 
+    # Stack projection mode
+    @property
+    def projection_mode(self) -> str:
+        return self.value(Conf.ProjectionMode, "mean", str)
+
+    @projection_mode.setter
+    def projection_mode(
+        self,
+        value: str,
+    ):
+        self.setValue(Conf.ProjectionMode, value)
+
     # Radial segments
     @property
     def radial_samples(self) -> int:
-        return self.value(Conf.RadialSamples, 200, int)
+        return self.value(Conf.RadialSamples, sampling.RADIAL_SAMPLES, int)
 
     @radial_samples.setter
     def radial_samples(
@@ -129,7 +166,7 @@ class Conf(QSettings):
     # Phase segments
     @property
     def phase_samples(self) -> int:
-        return self.value(Conf.PhaseSamples, 360, int)
+        return self.value(Conf.PhaseSamples, sampling.PHASE_SAMPLES, int)
 
     @phase_samples.setter
     def phase_samples(
@@ -138,5 +175,77 @@ class Conf(QSettings):
     ):
         self.setValue(Conf.PhaseSamples, value)
 
+    # Result cache
+    @property
+    def cache_enabled(self) -> bool:
+        return self.value(Conf.CacheEnabled, True, bool)
+
+    @cache_enabled.setter
+    def cache_enabled(
+        self,
+        value: bool,
+    ):
+        self.setValue(Conf.CacheEnabled, value)
+
+    # Result cache size (in MiB)
+    @property
+    def cache_size(self) -> int:
+        return self.value(Conf.CacheSize, 2048, int)
+
+    @cache_size.setter
+    def cache_size(
+        self,
+        value: int,
+    ):
+        self.setValue(Conf.CacheSize, value)
+
+    # Compression of the masks in the volume store
+    @property
+    def store_compression(self) -> str:
+        return self.value(Conf.StoreCompression, "none", str)
+
+    @store_compression.setter
+    def store_compression(
+        self,
+        value: str,
+    ):
+        self.setValue(Conf.StoreCompression, value)
+
+    # Memory budget for the masks of a stack (in MiB)
+    @property
+    def memory_budget(self) -> int:
+        return self.value(Conf.MemoryBudget, 1024, int)
+
+    @memory_budget.setter
+    def memory_budget(
+        self,
+        value: int,
+    ):
+        self.setValue(Conf.MemoryBudget, value)
+
+    # Per-stage profiling of the analysis
+    @property
+    def profiling(self) -> bool:
+        return self.value(Conf.Profiling, False, bool)
+
+    @profiling.setter
+    def profiling(
+        self,
+        value: bool,
+    ):
+        self.setValue(Conf.Profiling, value)
+
+    # Frame rate for playing through the layers of a stack
+    @property
+    def cine_rate(self) -> int:
+        return self.value(Conf.CineRate, 15, int)
+
+    @cine_rate.setter
+    def cine_rate(
+        self,
+        value: int,
+    ):
+        self.setValue(Conf.CineRate, value)
+
 
 conf = Conf()
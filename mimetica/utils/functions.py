@@ -2,106 +2,77 @@ import skimage as ski
 import shapely as shp
 from shapely.geometry import Polygon
 import numpy as np
-from PySide6.QtGui import QColor
-from PySide6.QtCore import QObject
-from PySide6.QtWidgets import QColorDialog
 
 
-def compute_minimal_bounding_circle(image: np.ndarray):
-    '''
-    Compute the minimal bounding circle (MBC) and radius.
+def _row_extremes(image: np.ndarray) -> np.ndarray:
+    """
+    Find the first and the last material pixel in each row of an image.
+
+    The convex hull of these points is the same as the convex hull of all
+    material pixels, so they are sufficient for computing the MBC.
 
     Args:
         image: The image being analysed.
 
     Returns:
-        The MBC and its radius.
-    '''
-
-    point_set = np.argwhere(image)
-    points = shp.MultiPoint(point_set)
-
-    mbc = shp.minimum_bounding_circle(points)
-    mbr = shp.minimum_bounding_radius(points)
-    return mbc, mbr
-
-
-def draw_sorted_circle(centre: np.ndarray, radius: np.ndarray):
-    rr, cc = ski.draw.circle_perimeter(
-        *centre.astype(np.uint32),
-        np.floor(radius).astype(np.uint32),
-        method="andres",
+        The coordinates of the extreme points as an N x 2 array.
+    """
+    mask = image != 0
+    rows = np.flatnonzero(mask.any(axis=1))
+    first = mask[rows].argmax(axis=1)
+    last = mask.shape[1] - 1 - mask[rows, ::-1].argmax(axis=1)
+    return np.vstack(
+        (
+            np.column_stack((rows, first)),
+            np.column_stack((rows, last)),
+        )
     )
-    rr = np.array(rr, dtype=np.uint32)
-    cc = np.array(cc, dtype=np.uint32)
-    angle = np.argsort(np.arctan2(cc - np.mean(cc), rr - np.mean(rr)))
-    rr = np.take(rr, angle, axis=0)
-    cc = np.take(cc, angle, axis=0)
-    return rr, cc
 
 
-def as_rgba(colour: QColor) -> str:
+def _bounding_circle(points: np.ndarray) -> tuple[np.ndarray, float]:
     """
-    Convert a QColor isntance (including opacity) into RGBA format
-    suitable for use in a stylesheet.
-
-    The R, G and B values are between 0 and 255, and the opacity
-    is between 0 and 1.
+    Compute the MBC of a set of points with a single call to shapely.
 
     Args:
-        colour:
-            A QColor instance.
+        points: An N x 2 array of point coordinates.
 
     Returns:
-        RGBA-formatted string.
+        The centre and the radius of the MBC.
     """
-    return ",".join(
-        str(c)
-        for c in [
-            colour.red(),
-            colour.green(),
-            colour.blue(),
-            colour.alphaF(),
-        ]
-    )
+    mbc = shp.minimum_bounding_circle(shp.MultiPoint(points))
+    centre = np.array(mbc.centroid.coords).flatten()
+    radius = np.sqrt(((points - centre) ** 2).sum(axis=1)).max()
+    return centre, radius
 
 
-def as_hex(colour: QColor) -> str:
+def compute_minimal_bounding_circle(
+    image: np.ndarray,
+) -> tuple[np.ndarray, float]:
     """
-    Convert a QColor isntance (including opacity) into hex format.
+    Compute the centre and the radius of the minimal bounding circle (MBC).
+
+    Only the leftmost and rightmost material pixels in each row are
+    considered since the MBC depends only on the convex hull of the material.
 
     Args:
-        colour:
-            A QColor instance.
+        image: The image being analysed.
 
     Returns:
-        The hex representation.
+        The centre and the radius of the MBC.
     """
-    return "#" + "".join(
-        [
-            f"{colour.red():02X}",
-            f"{colour.green():02X}",
-            f"{colour.blue():02X}",
-            f"{colour.alpha():02X}",
-        ]
-    )
-
 
-def get_colour(
-    initial: QColor = None,
-    parent: QObject = None,
-    title: str = "Pick a colour",
-) -> QColor:
-    """
-    Get a QColor from a QColorDialog.
+    return _bounding_circle(_row_extremes(image))
 
-    Returns:
-        The selected colour.
-    """
 
-    return QColorDialog.getColor(
-        initial,
-        parent,
-        title,
-        QColorDialog.ColorDialogOption.ShowAlphaChannel,
+def draw_sorted_circle(centre: np.ndarray, radius: np.ndarray):
+    rr, cc = ski.draw.circle_perimeter(
+        *centre.astype(np.uint32),
+        np.floor(radius).astype(np.uint32),
+        method="andres",
     )
+    rr = np.array(rr, dtype=np.uint32)
+    cc = np.array(cc, dtype=np.uint32)
+    angle = np.argsort(np.arctan2(cc - np.mean(cc), rr - np.mean(rr)))
+    rr = np.take(rr, angle, axis=0)
+    cc = np.take(cc, angle, axis=0)
+    return rr, cc
@@ -0,0 +1,339 @@
+from pathlib import Path
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+
+class Profile:
+    """
+    Wall time, CPU time and peak memory allocated by each stage
+    of the analysis, aggregated over every time the stage ran.
+
+    Each run of a stage is also kept as an event for the trace.
+    Profiles collected in different processes are combined with `merge`.
+
+    tracemalloc keeps a single peak for the whole process, so peaks are
+    only measured for stages that run in the thread that created the
+    profile (the main thread of a worker process or the thread loading
+    a stack) while no other profile is being collected. Their peaks
+    include memory allocated by other threads in the meantime. Other
+    stages are recorded with a peak of 0.
+    """
+
+    def __init__(self):
+        """
+        Create an empty profile.
+        """
+        self.stages: dict[str, dict[str, float]] = {}
+        self.events: list[dict] = []
+        self.owner = threading.get_ident()
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> dict:
+        return {"stages": self.stages, "events": self.events}
+
+    def __setstate__(
+        self,
+        state: dict,
+    ):
+        self.__dict__.update(state)
+        self.owner = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.stages)
+
+    def record(
+        self,
+        name: str,
+        start: float,
+        wall: float,
+        cpu: float,
+        peak: int,
+    ):
+        """
+        Record a run of a stage.
+
+        Args:
+            name: Name of the stage.
+            start: Start time (as returned by `time.time`).
+            wall: Wall time in seconds.
+            cpu: CPU time of the thread in seconds.
+            peak: Peak memory allocated during the stage in bytes.
+        """
+        event = {
+            "name": name,
+            "ph": "X",
+            "pid": os.getpid(),
+            "tid": threading.get_native_id(),
+            "ts": start * 1e6,
+            "dur": wall * 1e6,
+            "args": {"cpu": cpu, "peak": peak},
+        }
+        with self._lock:
+            self._add(name, 1, wall, cpu, peak)
+            self.events.append(event)
+
+    def _add(
+        self,
+        name: str,
+        count: int,
+        wall: float,
+        cpu: float,
+        peak: int,
+    ):
+        stats = self.stages.setdefault(
+            name,
+            {"count": 0, "wall": 0.0, "cpu": 0.0, "peak": 0},
+        )
+        stats["count"] += count
+        stats["wall"] += wall
+        stats["cpu"] += cpu
+        stats["peak"] = max(stats["peak"], peak)
+
+    def merge(
+        self,
+        other: "Profile",
+    ):
+        """
+        Add the stages recorded by another profile.
+
+        Args:
+            other: The other profile.
+        """
+        with self._lock:
+            for name, stats in other.stages.items():
+                self._add(name, stats["count"], stats["wall"], stats["cpu"], stats["peak"])
+            self.events.extend(other.events)
+
+    def summary(self) -> str:
+        """
+        A one-line summary of the total wall time of each stage,
+        slowest first.
+
+        Returns:
+            The summary.
+        """
+        stages = sorted(self.stages.items(), key=lambda item: -item[1]["wall"])
+        return ", ".join(f"{name} {stats['wall']:.2f} s" for (name, stats) in stages)
+
+    def log(self):
+        """
+        Log a table of the stages.
+        """
+        # Imported here so that workers only import the logger if they log
+        from mimetica import logger
+
+        logger.info(
+            f"{'Stage':<20} {'Runs':>6} {'Wall [s]':>10} {'CPU [s]':>10} {'Peak [MiB]':>11}"
+        )
+        for name, stats in sorted(self.stages.items(), key=lambda item: -item[1]["wall"]):
+            logger.info(
+                f"{name:<20} {stats['count']:>6} {stats['wall']:>10.3f} "
+                f"{stats['cpu']:>10.3f} {stats['peak'] / 2**20:>11.1f}"
+            )
+
+    def write_trace(
+        self,
+        path: Path,
+    ):
+        """
+        Write the stages to a trace in the Chrome trace event format,
+        which can be opened in chrome://tracing or https://ui.perfetto.dev.
+
+        Args:
+            path: Path to the trace (JSON).
+        """
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            trace = {
+                "traceEvents": self.events,
+                "displayTimeUnit": "ms",
+                "otherData": {"stages": self.stages},
+            }
+        Path(path).write_text(json.dumps(trace))
+
+
+# The profile collected by the current thread (None if profiling is disabled).
+# Each load of a stack runs in its own thread and collects its own profile.
+_profile: contextvars.ContextVar[Profile | None] = contextvars.ContextVar(
+    "profile",
+    default=None,
+)
+
+# Number of profiles being collected in this process.
+# Memory allocations are traced while there are any.
+_active = 0
+_active_lock = threading.Lock()
+
+# Stages that are running in each thread
+_local = threading.local()
+
+
+class _Stage:
+    """
+    Measures a single run of a stage.
+    """
+
+    __slots__ = ("name", "profile", "start", "wall", "cpu", "base", "peak")
+
+    def __init__(
+        self,
+        name: str,
+        profile: Profile,
+    ):
+        self.name = name
+        self.profile = profile
+
+    def __enter__(self):
+        stack = _local.__dict__.setdefault("stack", [])
+        stack.append(self)
+
+        # Resetting the peak of tracemalloc affects the whole process,
+        # so it would discard the peak of a stage running in another thread.
+        if threading.get_ident() == self.profile.owner and _active == 1:
+            self.base = tracemalloc.get_traced_memory()[0]
+            self.peak = self.base
+            tracemalloc.reset_peak()
+        else:
+            self.base = None
+
+        self.start = time.time()
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        return self
+
+    def __exit__(self, *args):
+        wall = time.perf_counter() - self.wall
+        cpu = time.thread_time() - self.cpu
+        stack = _local.stack
+        stack.pop()
+        if self.base is None or not tracemalloc.is_tracing():
+            self.profile.record(self.name, self.start, wall, cpu, 0)
+            return
+
+        peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+
+        # Nested stages reset the peak, so it is passed on to the enclosing stage
+        if len(stack) > 0 and stack[-1].base is not None:
+            stack[-1].peak = max(stack[-1].peak, peak)
+
+        self.profile.record(self.name, self.start, wall, cpu, peak - self.base)
+
+
+def enable(
+    enabled: bool = True,
+):
+    """
+    Enable or disable profiling in the current thread.
+
+    Enabling profiling starts a new, empty profile for the thread
+    and starts tracing memory allocations, which slows down the analysis.
+    Tracing stops once the last profile in the process is disabled.
+    Peak memory is only measured for the stages of the calling thread
+    (see `Profile`).
+
+    Stages that run in other threads are only recorded in the profile
+    if they run in a copy of the context of this thread
+    (see `contextvars.copy_context`).
+
+    Args:
+        enabled: Whether to profile.
+    """
+    global _active
+
+    previous = _profile.get()
+    if enabled:
+        _profile.set(Profile())
+        if previous is None:
+            with _active_lock:
+                _active += 1
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+    else:
+        _profile.set(None)
+        if previous is not None:
+            with _active_lock:
+                _active -= 1
+                if _active == 0 and tracemalloc.is_tracing():
+                    tracemalloc.stop()
+
+
+def enabled() -> bool:
+    return _profile.get() is not None
+
+
+def collect() -> Profile:
+    """
+    Take the stages recorded so far in the current thread
+    and start a new profile.
+
+    Returns:
+        The profile (empty if profiling is disabled).
+    """
+    profile = _profile.get()
+    if profile is None:
+        return Profile()
+
+    _profile.set(Profile())
+    return profile
+
+
+def stage(name: str):
+    """
+    Measure a stage of the analysis.
+
+    Usage::
+
+        with profiling.stage("decode"):
+            image = ski.io.imread(path)
+
+    If profiling is disabled, this returns a context manager that does nothing.
+
+    Args:
+        name: Name of the stage.
+
+    Returns:
+        A context manager.
+    """
+    profile = _profile.get()
+    if profile is None:
+        return _null
+    return _Stage(name, profile)
+
+
+def call(
+    profile: bool,
+    function,
+    *args,
+) -> tuple:
+    """
+    Call a function (typically in a worker process) and
+    collect the stages that it ran.
+
+    Args:
+        profile: Whether to profile the call.
+        function: The function.
+        args: The arguments of the function.
+
+    Returns:
+        The result of the function and the profile (None if not profiled).
+    """
+    if not profile:
+        if enabled():
+            enable(False)
+        return function(*args), None
+
+    if not enabled():
+        enable()
+    collect()
+    result = function(*args)
+    return result, collect()
+
+
+_null = contextlib.nullcontext()
@@ -0,0 +1,48 @@
+import numpy as np
+
+from mimetica.scan.statistics import RunningStatistics
+
+
+def _accumulate(profiles: np.ndarray) -> RunningStatistics:
+    statistics = RunningStatistics()
+    for profile in profiles:
+        statistics.add(profile)
+    return statistics
+
+
+def test_running_statistics_match_numpy():
+    rng = np.random.default_rng(0)
+    profiles = rng.normal(5.0, 2.0, size=(50, 16))
+
+    statistics = _accumulate(profiles)
+
+    np.testing.assert_allclose(statistics.mean, profiles.mean(axis=0))
+    np.testing.assert_allclose(statistics.sd, profiles.std(axis=0))
+    np.testing.assert_array_equal(statistics.min, profiles.min(axis=0))
+    np.testing.assert_array_equal(statistics.max, profiles.max(axis=0))
+    np.testing.assert_array_equal(statistics.count, np.full(16, 50))
+
+
+def test_running_statistics_skip_non_finite_bins():
+    rng = np.random.default_rng(1)
+    profiles = rng.uniform(0.0, 1.0, size=(20, 8))
+    profiles[::3, 2] = np.nan
+    profiles[1, 5] = np.inf
+    profiles[:, 7] = np.nan
+
+    statistics = _accumulate(profiles)
+
+    masked = np.where(np.isfinite(profiles), profiles, np.nan)
+    np.testing.assert_allclose(statistics.mean[:7], np.nanmean(masked[:, :7], axis=0))
+    np.testing.assert_allclose(statistics.sd[:7], np.nanstd(masked[:, :7], axis=0))
+    np.testing.assert_array_equal(statistics.count, np.isfinite(profiles).sum(axis=0))
+    assert np.isnan(statistics.sd[7])
+
+
+def test_running_statistics_are_stable_with_a_large_offset():
+    rng = np.random.default_rng(2)
+    profiles = 1e9 + rng.normal(0.0, 1e-3, size=(1000, 4))
+
+    statistics = _accumulate(profiles)
+
+    np.testing.assert_allclose(statistics.sd, profiles.std(axis=0), rtol=1e-4)